@@ -0,0 +1,36 @@
+"""
+Compares two JSON files written by benchmarks.run::
+
+    python -m benchmarks.compare before.json after.json
+"""
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        sys.exit(__doc__.strip())
+    before, after = load(argv[0])['results'], load(argv[1])['results']
+
+    row = '{:<20} {:>12} {:>12} {:>8} {:>10} {:>10}'
+    print(row.format('benchmark', 'before (ms)', 'after (ms)', 'change', 'queries', 'queries'))
+    for name in sorted(set(before) | set(after)):
+        old, new = before.get(name), after.get(name)
+        if old is None or new is None:
+            print(row.format(name, old and old['median_ms'] or '-', new and new['median_ms'] or '-',
+                             '-', old and old['queries'] or '-', new and new['queries'] or '-'))
+            continue
+        change = '-'
+        if old['median_ms']:
+            change = '{:+.0%}'.format((new['median_ms'] - old['median_ms']) / old['median_ms'])
+        print(row.format(name, old['median_ms'], new['median_ms'], change, old['queries'], new['queries']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Benchmarks the blog views, the feed, the sitemap, the search index and the
+admin against a synthetic blog, and writes the results as JSON.
+
+Run it from the root of the repository::
+
+    python -m benchmarks.run --posts 500 --commits 3 --tags 30 --depth 3 \\
+        --output before.json
+
+and compare two runs with ``python -m benchmarks.compare before.json
+after.json``.
+
+Before seeding, it checks that the list, the feed and the detail view make
+the same number of queries with one post as with a few pages of them, and
+fails if they don't. ``--skip-query-check`` skips it.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def measure(func, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            func()
+            timings.append((time.time() - start) * 1000)
+    timings.sort()
+    return {
+        'queries': len(queries),
+        'min_ms': round(timings[0], 3),
+        'median_ms': round(timings[len(timings) // 2], 3),
+        'max_ms': round(timings[-1], 3),
+    }
+
+
+def get(client, url):
+    def request():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise AssertionError('%s returned %s' % (url, response.status_code))
+        # Force lazy responses to render.
+        response.content
+    return request
+
+
+def count_queries(client, urls):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    counts = {}
+    for name, url in urls.items():
+        # The first request fills the caches, if there are any.
+        get(client, url)()
+        with CaptureQueriesContext(connection) as queries:
+            get(client, url)()
+        counts[name] = len(queries)
+    return counts
+
+
+class Rollback(Exception):
+    pass
+
+
+def check_query_counts(client, posts=25):
+    """
+    Raises AssertionError unless the list, the feed and the detail view make
+    as many queries with one post as with `posts` posts. Everything it
+    creates is rolled back.
+    """
+    from django.contrib.auth import get_user_model
+    from django.core.cache import caches
+    from django.core.urlresolvers import reverse
+    from django.db import transaction
+
+    from widgy_blog import cache
+    from widgy_blog.models import BlogLayout, Tag
+
+    from .seed import seed, add_posts
+
+    try:
+        with transaction.atomic():
+            seed(posts=1)
+            urls = {
+                'list': reverse('blog_list'),
+                'feed': reverse('blog_rss_feed'),
+                'detail': BlogLayout.objects.published().get().get_absolute_url(),
+            }
+            one = count_queries(client, urls)
+            users = list(get_user_model().objects.filter(is_superuser=False))
+            add_posts(posts - 1, users, list(Tag.objects.all()), start=1)
+            many = count_queries(client, urls)
+            raise Rollback
+    except Rollback:
+        pass
+    finally:
+        # Rolled back primary keys can be reused.
+        for backend in caches.all():
+            backend.clear()
+        cache.invalidate()
+
+    if one != many:
+        raise AssertionError('The number of queries depends on the number of posts: %s with 1 post, '
+                             '%s with %d posts' % (one, many, posts))
+    return one
+
+
+def get_benchmarks(client, admin_client, posts):
+    # Only what the first release had is used here, so that the same
+    # benchmarks run against it.
+    from django.core.urlresolvers import reverse, NoReverseMatch
+    from django.utils import timezone
+
+    from widgy_blog.models import BlogLayout
+
+    published = BlogLayout.objects.published().order_by('-date')
+    middle = published[published.count() // 2]
+    date = timezone.localtime(middle.date)
+    tag = middle.tags.all()[0]
+    last_page = max(1, (posts + 9) // 10)
+
+    benchmarks = [
+        ('list', get(client, reverse('blog_list'))),
+        ('list_deep', get(client, reverse('blog_list') + '?page=%d' % last_page)),
+        ('tag', get(client, reverse('blog_tag', kwargs={'tag': tag.slug}))),
+        ('archive_year', get(client, reverse('blog_archive_year', kwargs={'year': date.year}))),
+        ('archive_month', get(client, reverse('blog_archive_month', kwargs={
+            'year': date.year, 'month': '%02d' % date.month,
+        }))),
+        ('detail', get(client, middle.get_absolute_url())),
+        ('feed', get(client, reverse('blog_rss_feed'))),
+        ('sitemap', get(client, reverse('benchmark_sitemap'))),
+        ('admin_changelist', get(admin_client, reverse('admin:widgy_blog_blog_changelist'))),
+    ]
+    try:
+        url = reverse('blog_sitemap', kwargs={'section': date.year})
+    except NoReverseMatch:
+        pass
+    else:
+        benchmarks.append(('sitemap_year', get(client, url)))
+
+    try:
+        from widgy_blog.search_indexes import BlogIndex
+    except ImportError:
+        pass
+    else:
+        index = BlogIndex()
+        blog = middle.owner
+        benchmarks.append(('index_prepare', lambda: index.prepare(blog)))
+
+    return benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--posts', type=int, default=100)
+    parser.add_argument('--commits', type=int, default=2, help='Commits per post.')
+    parser.add_argument('--tags', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=2, help='Depth of the widget trees.')
+    parser.add_argument('--repeat', type=int, default=10, help='Runs of each benchmark.')
+    parser.add_argument('--output', help='File to write the results to, instead of stdout.')
+    parser.add_argument('--skip-query-check', action='store_true',
+                        help="Don't check that the list, feed and detail queries are constant.")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+
+    from .seed import seed
+
+    call_command('migrate', verbosity=0, interactive=False)
+    client = Client()
+    query_counts = None
+    if not args.skip_query_check:
+        query_counts = check_query_counts(client)
+        sys.stderr.write('constant queries: %s\n' % query_counts)
+
+    start = time.time()
+    seed(posts=args.posts, commits=args.commits, tags=args.tags, depth=args.depth)
+    seed_time = time.time() - start
+
+    admin_client = Client()
+    admin_client.login(username='admin', password='admin')
+
+    results = {}
+    for name, func in get_benchmarks(client, admin_client, args.posts):
+        results[name] = measure(func, args.repeat)
+        sys.stderr.write('%s: %s\n' % (name, results[name]))
+
+    output = {
+        'config': {
+            'posts': args.posts,
+            'commits': args.commits,
+            'tags': args.tags,
+            'depth': args.depth,
+            'repeat': args.repeat,
+            'database': connection.vendor,
+            'django': django.get_version(),
+        },
+        'seed_seconds': round(seed_time, 3),
+        'constant_queries': query_counts,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+    else:
+        json.dump(output, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
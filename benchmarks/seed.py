@@ -0,0 +1,86 @@
+"""
+Creates a synthetic blog to benchmark against.
+"""
+import datetime
+import random
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from widgy.contrib.page_builder.models import Accordion, Html
+
+from widgy_blog.models import Blog, BlogLayout, Tag
+
+from .widgy_site import site
+
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+    'tempor incididunt ut labore et dolore magna aliqua'
+).split()
+
+
+def paragraph(rng, length=40):
+    return '<p>%s</p>' % ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def build_tree(parent, depth, rng):
+    """
+    Adds some HTML below `parent`, and accordions nested `depth` levels deep.
+    Every accordion starts out with two sections.
+    """
+    parent.add_child(site, Html, content=paragraph(rng))
+    if depth > 0:
+        accordion = parent.add_child(site, Accordion)
+        for section in accordion.get_children():
+            build_tree(section, depth - 1, rng)
+
+
+def seed(posts=100, commits=2, tags=20, depth=2, authors=5, random_seed=0):
+    """
+    Creates `posts` published blog posts, each committed `commits` times
+    with a tree of widgets `depth` levels deep and a few of `tags` tags.
+    """
+    rng = random.Random(random_seed)
+    User = get_user_model()
+
+    User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+    users = [
+        User.objects.create_user('author%d' % i, 'author%d@example.com' % i, 'author',
+                                 first_name='Author', last_name=str(i))
+        for i in range(authors)
+    ]
+    all_tags = [Tag.objects.create(name='Tag %d' % i) for i in range(tags)]
+    add_posts(posts, users, all_tags, commits, depth, rng)
+
+
+def add_posts(posts, users, tags, commits=2, depth=2, rng=None, start=0):
+    """
+    Creates `posts` more published blog posts by `users`, numbered from
+    `start`.
+    """
+    rng = rng or random.Random(start)
+    VersionTracker = site.get_version_tracker_model()
+
+    now = timezone.now()
+    for i in range(start, start + posts):
+        author = rng.choice(users)
+        layout = BlogLayout.add_root(
+            site,
+            title='Post %d' % i,
+            author=author,
+            date=now - datetime.timedelta(days=i * 3, minutes=rng.randint(0, 600)),
+            summary=paragraph(rng, 20),
+        )
+        post_tags = rng.sample(tags, min(3, len(tags)))
+        layout.tags.add(*post_tags)
+        main = layout.get_children()[0]
+        build_tree(main, depth, rng)
+
+        tracker = VersionTracker.objects.create(working_copy=layout.node)
+        Blog.objects.create(content=tracker)
+        for _ in range(commits):
+            commit = tracker.commit(user=author)
+            # Before BlogLayout.clone copied them, commits had no tags.
+            layout = commit.root_node.content
+            if not layout.tags.exists():
+                layout.tags.add(*post_tags)
@@ -0,0 +1,102 @@
+"""
+Settings for running the benchmarks against a throwaway database.
+
+The database defaults to a SQLite file in a temporary directory. Set
+``DATABASE_URL`` (with dj-database-url installed) to benchmark against
+another database, e.g. PostgreSQL.
+"""
+import os
+import tempfile
+
+TEMP_DIR = tempfile.mkdtemp(prefix='widgy_blog_bench_')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(TEMP_DIR, 'bench.sqlite3'),
+    },
+}
+if os.environ.get('DATABASE_URL'):
+    import dj_database_url
+    DATABASES['default'] = dj_database_url.config()
+
+# The benchmarks measure the work done on a cache miss unless
+# BENCHMARK_CACHE=locmem.
+if os.environ.get('BENCHMARK_CACHE') == 'locmem':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+SECRET_KEY = 'widgy_blog_benchmarks'
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+SITE_ID = 1
+USE_TZ = True
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    'django.contrib.sites',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.admin',
+    'django.contrib.staticfiles',
+    'django.contrib.sitemaps',
+    'widgy',
+    'widgy.contrib.page_builder',
+    'widgy.contrib.form_builder',
+    'filer',
+    'easy_thumbnails',
+    'treebeard',
+    'compressor',
+    'argonauts',
+    'widgy_blog',
+]
+
+try:
+    import haystack  # NOQA
+except ImportError:
+    pass
+else:
+    INSTALLED_APPS.append('haystack')
+    HAYSTACK_CONNECTIONS = {
+        'default': {'ENGINE': 'haystack.backends.simple_backend.SimpleEngine'},
+    }
+
+MIDDLEWARE_CLASSES = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'benchmarks.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [os.path.join(os.path.dirname(__file__), 'templates')],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'django.template.context_processors.request',
+                'django.template.context_processors.static',
+            ],
+        },
+    },
+]
+
+STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(TEMP_DIR, 'static')
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(TEMP_DIR, 'media')
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'compressor.finders.CompressorFinder',
+]
+
+WIDGY_MEZZANINE_SITE = 'benchmarks.widgy_site.site'
+WIDGY_BLOG_EAGER_LOAD = True
@@ -0,0 +1,15 @@
+from django.conf.urls import include, url
+from django.contrib import admin
+from django.contrib.sitemaps.views import sitemap
+
+from widgy_blog.sitemaps import BlogSitemap
+
+from .widgy_site import site
+
+urlpatterns = [
+    url(r'^admin/', include(admin.site.urls)),
+    url(r'^widgy/', include(site.urls)),
+    url(r'^blog/', include('widgy_blog.urls')),
+    # The sitemap as the first release served it, so that it can be compared.
+    url(r'^sitemap\.xml$', sitemap, {'sitemaps': {'blog': BlogSitemap}}, name='benchmark_sitemap'),
+]
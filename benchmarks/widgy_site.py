@@ -0,0 +1,7 @@
+from widgy.site import WidgySite
+
+
+class BenchmarkSite(WidgySite):
+    pass
+
+site = BenchmarkSite()
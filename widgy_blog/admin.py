@@ -1,6 +1,7 @@
 from functools import partial
 
 from django.contrib import admin
+from django.db import connection
 from django.core.exceptions import ObjectDoesNotExist
 from django.forms.models import modelform_factory
 from django.contrib.admin.views.main import ChangeList
@@ -9,13 +10,24 @@ from django.contrib.auth import get_user_model
 
 from widgy.admin import WidgyAdmin
 from widgy.forms import WidgyForm
-from widgy.models import Node
+from widgy.models import VersionCommit
 
-from .models import Blog, BlogLayout, Tag
+from .models import Blog, BlogLayout, BlogSchedule, Tag
 
 User = get_user_model()
 
 
+def last_commit_sql(owner_model):
+    qn = connection.ops.quote_name
+    return 'SELECT MAX(c.{created_at}) FROM {commit} c WHERE c.{tracker} = {owner}.{owner_content}'.format(
+        created_at=qn(VersionCommit._meta.get_field('created_at').column),
+        commit=qn(VersionCommit._meta.db_table),
+        tracker=qn(VersionCommit._meta.get_field('tracker').column),
+        owner=qn(owner_model._meta.db_table),
+        owner_content=qn(owner_model._meta.get_field('content').column),
+    )
+
+
 class IsPublishedListFilter(admin.SimpleListFilter):
     title = 'Published'
     parameter_name = 'is_published'
@@ -29,13 +41,9 @@ class IsPublishedListFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == '0':
-            return queryset.exclude(
-                content__commits__root_node__content_id__in=self.model.objects.published()
-            ).distinct()
+            return queryset.filter(published_blog__isnull=True)
         if self.value() == '1':
-            return queryset.filter(
-                content__commits__root_node__content_id__in=self.model.objects.published()
-            ).distinct()
+            return queryset.filter(published_blog__isnull=False)
 
 
 class AuthorListFilter(admin.SimpleListFilter):
@@ -49,10 +57,7 @@ class AuthorListFilter(admin.SimpleListFilter):
     def queryset(self, request, queryset):
         pk = self.value()
         if pk:
-            layouts_by_this_author = BlogLayout.objects.filter(author__pk=pk)
-            return queryset.filter(
-                content__working_copy__content_id__in=layouts_by_this_author
-            ).distinct()
+            return queryset.filter(working_author=pk)
 
 
 class BlogForm(WidgyForm):
@@ -72,16 +77,21 @@ class BlogForm(WidgyForm):
         super(BlogForm, self).__init__(*args, **kwargs)
 
 
-class BlogChangeList(ChangeList):
-    def get_results(self, request):
-        super(BlogChangeList, self).get_results(request)
-        # This is like prefetch_related, but works with our GenericForeignKey
-        Node.attach_content_instances(i.content.working_copy for i in self.result_list)
+class BlogScheduleInline(admin.StackedInline):
+    model = BlogSchedule
+    max_num = 1
+    can_delete = True
+
+
+# Deprecated. The changelist no longer fetches the working copies, so
+# BlogAdmin uses the default ChangeList.
+BlogChangeList = ChangeList
 
 
 class BlogAdmin(WidgyAdmin):
     form = BlogForm
     layout_model = BlogLayout
+    inlines = [BlogScheduleInline]
     # These are the fields that are actually stored in widgy, not the
     # owner. We copy them back and forth to make the editing interface
     # nicer.
@@ -98,7 +108,7 @@ class BlogAdmin(WidgyAdmin):
         'tags',
     ]
     list_filter = [IsPublishedListFilter, AuthorListFilter]
-    list_display = ['title', 'author']
+    list_display = ['title', 'author', 'is_published', 'last_modified']
 
     fieldsets = [
         (None, {
@@ -114,11 +124,35 @@ class BlogAdmin(WidgyAdmin):
     ]
 
     def get_queryset(self, request):
-        return self.model.objects.select_related('content__working_copy')
+        # The titles and authors are copied onto the blogs, and the last
+        # commit is selected along with them, instead of fetching the working
+        # copy of each one.
+        return self.model.objects.select_related(
+            'working_author', 'published_blog',
+        ).extra(select={'last_modified': last_commit_sql(self.model)})
+
     queryset = get_queryset
 
-    def get_changelist(self, *args, **kwargs):
-        return BlogChangeList
+    def title(self, obj):
+        return obj.working_title
+    title.admin_order_field = 'working_title'
+
+    def author(self, obj):
+        return obj.working_author
+    author.admin_order_field = 'working_author__%s' % User.USERNAME_FIELD
+
+    def is_published(self, obj):
+        try:
+            return obj.published_blog is not None
+        except ObjectDoesNotExist:
+            return False
+    is_published.boolean = True
+    is_published.short_description = 'Published'
+    is_published.admin_order_field = 'published_blog'
+
+    def last_modified(self, obj):
+        return obj.last_modified
+    last_modified.admin_order_field = 'last_modified'
 
     def get_form(self, request, obj=None, **kwargs):
         # We need to get the fields for BlogLayout
@@ -152,6 +186,7 @@ class BlogAdmin(WidgyAdmin):
             for field_name, value in layout_data.items():
                 setattr(content, field_name, value)
             content.save()
+        obj.set_layout_fields('working_', obj.content.working_copy.content)
 
         return super(BlogAdmin, self).save_model(request, obj, form, change)
 
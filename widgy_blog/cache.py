@@ -0,0 +1,138 @@
+import copy
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import six
+from django.utils.encoding import force_bytes
+from django.utils.safestring import mark_safe
+
+from . import instrumentation
+
+GENERATION_KEY = 'widgy_blog:generation'
+
+
+def get_cache():
+    return caches[getattr(settings, 'WIDGY_BLOG_CACHE', 'default')]
+
+
+def get_generation():
+    """
+    Everything cached with make_key is only valid for the current generation.
+    """
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seed with the time instead of 1, so that keys from before the
+        # generation was evicted can't be reused.
+        cache.add(GENERATION_KEY, int(time.time()), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def make_key(*parts):
+    return ':'.join(['widgy_blog', str(get_generation())] + [str(part) for part in parts])
+
+
+def invalidate():
+    """
+    Expires everything that was cached with make_key. This happens whenever
+    the published blogs change.
+    """
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        get_generation()
+    local_cache.clear()
+
+
+class RenderCache(object):
+    """
+    Caches the HTML of rendered widgy trees. Committed trees can't change, so
+    the root node together with the template set identifies the output.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_cache(self):
+        alias = getattr(settings, 'WIDGY_BLOG_RENDER_CACHE', None)
+        if alias is None:
+            return get_cache()
+        return caches[alias]
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'WIDGY_BLOG_RENDER_CACHE_MAX_SIZE', 256 * 1024)
+
+    def make_key(self, root_node, template_set):
+        template_set = hashlib.md5(force_bytes(template_set)).hexdigest()
+        return 'widgy_blog:render:%s:%s' % (root_node.pk, template_set)
+
+    def is_storable(self, html):
+        # Forms include the CSRF token of the request that rendered them.
+        return len(html) <= self.max_size and 'csrfmiddlewaretoken' not in html
+
+    def get_or_render(self, root_node, template_set, render):
+        cache = self.get_cache()
+        key = self.make_key(root_node, template_set)
+        html = cache.get(key)
+        if html is not None:
+            self.hits += 1
+            instrumentation.record_cache('render', True)
+            return mark_safe(html)
+
+        self.misses += 1
+        instrumentation.record_cache('render', False)
+        html = render()
+        if self.is_storable(html):
+            cache.set(key, six.text_type(html))
+        return html
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+render_cache = RenderCache()
+
+
+class LocalCache(object):
+    """
+    A small cache in the memory of the process, for objects that are fine to
+    be a few seconds stale. Each caller gets its own copy of the objects, so
+    they can be modified.
+    """
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                expires, value = self.data[key]
+            except KeyError:
+                return None
+            if expires < time.time():
+                del self.data[key]
+                return None
+        return copy.deepcopy(value)
+
+    def set(self, key, value, timeout):
+        if not timeout:
+            return
+        value = copy.deepcopy(value)
+        with self.lock:
+            if len(self.data) >= self.max_entries:
+                self.data.clear()
+            self.data[key] = (time.time() + timeout, value)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+local_cache = LocalCache()
@@ -0,0 +1,62 @@
+"""
+The plain text of blog posts, for searching. Used by both the haystack index
+and the built in search, so it doesn't depend on haystack.
+"""
+from collections import defaultdict
+
+from django.db.models import Q
+from django.http import HttpRequest
+from django.contrib.auth import get_user_model
+
+from widgy.models import Node
+from widgy.templatetags.widgy_tags import render_root
+from widgy.utils import html_to_plaintext
+
+
+def fake_request():
+    r = HttpRequest()
+    r.user = get_user_model()()
+    return r
+
+
+def prefetch_trees(root_nodes):
+    """
+    Like Node.prefetch_trees, but fetches the descendants of all of the root
+    nodes with a single query. The contents are fetched with a query per
+    content type, for all of the trees at once.
+    """
+    roots = [node for node in root_nodes if not hasattr(node, '_children')]
+    if not roots:
+        return
+
+    query = Q()
+    for root in roots:
+        query |= Q(path__startswith=root.path)
+    descendants = [node for node in Node.objects.filter(query, depth__gt=1).order_by('path')]
+    Node.attach_content_instances(roots + descendants)
+
+    trees = defaultdict(list)
+    for node in descendants:
+        trees[node.path[:Node.steplen]].append(node)
+    for root in roots:
+        root._parent = None
+        root.consume_children(trees[root.path])
+
+
+def get_plaintext(owner, root_node, request=None):
+    """
+    The text of the tree under `root_node`, followed by the title and summary
+    of its layout.
+    """
+    root_node.maybe_prefetch_tree()
+    layout = root_node.content
+    ctx = {
+        'request': request or fake_request(),
+        'root_node_override': root_node,
+    }
+    html = render_root(ctx, owner, 'content')
+    return ' '.join([
+        html_to_plaintext(html),
+        layout.title,
+        layout.summary or '',
+    ])
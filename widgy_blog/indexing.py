@@ -0,0 +1,158 @@
+"""
+Updating the haystack index of blogs in batches, optionally using several
+processes, and incrementally, from the commits that changed since the last
+update.
+"""
+import multiprocessing
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from haystack import connections, DEFAULT_ALIAS
+
+from .models import Blog, PublishedBlog, IndexedBlog
+from .utils import chunked, close_db_connections
+
+
+def get_index(using=DEFAULT_ALIAS):
+    return connections[using].get_unified_index().get_index(Blog)
+
+
+def record_indexed(using, blog_pks):
+    commits = PublishedBlog.objects.filter(blog_id__in=blog_pks).values_list('blog_id', 'commit_id')
+    with transaction.atomic():
+        IndexedBlog.objects.filter(using=using, blog_pk__in=blog_pks).delete()
+        IndexedBlog.objects.bulk_create(
+            IndexedBlog(using=using, blog_pk=blog_pk, commit_pk=commit_pk)
+            for blog_pk, commit_pk in commits
+        )
+
+
+def index_batch(args):
+    """
+    Indexes the blogs with the pks given. Returns the number of blogs
+    indexed.
+    """
+    using, pks = args
+    index = get_index(using)
+    blogs = [blog for blog in index.get_model().objects.filter(pk__in=pks).select_related('content')]
+    index.prefetch_published_nodes(blogs)
+    try:
+        connections[using].get_backend().update(index, blogs)
+    finally:
+        index.clear_published_nodes()
+    record_indexed(using, [blog.pk for blog in blogs])
+    return len(blogs)
+
+
+def remove_blogs(pks, using=DEFAULT_ALIAS):
+    model = get_index(using).get_model()
+    backend = connections[using].get_backend()
+    for pk in pks:
+        backend.remove('%s.%s.%s' % (model._meta.app_label, model._meta.model_name, pk))
+    IndexedBlog.objects.filter(using=using, blog_pk__in=pks).delete()
+
+
+def reindex(pks, using=DEFAULT_ALIAS, workers=1, batch_size=100):
+    """
+    Indexes the blogs with the pks given. Yields the number of blogs indexed
+    as each batch finishes.
+    """
+    batches = ((using, batch) for batch in chunked(pks, batch_size))
+    if workers <= 1:
+        for batch in batches:
+            yield index_batch(batch)
+        return
+
+    close_db_connections()
+    pool = multiprocessing.Pool(workers, initializer=close_db_connections)
+    try:
+        for count in pool.imap_unordered(index_batch, batches):
+            yield count
+    finally:
+        pool.close()
+        pool.join()
+
+
+def get_changes(using=DEFAULT_ALIAS, pks=None):
+    """
+    Compares the index with the published blogs. Returns the pks of the blogs
+    whose published commit changed since they were indexed, and the pks of
+    the blogs that are no longer published. `pks` limits the comparison to
+    some blogs.
+    """
+    published = PublishedBlog.objects.all()
+    indexed = IndexedBlog.objects.filter(using=using)
+    if pks is not None:
+        published = published.filter(blog_id__in=pks)
+        indexed = indexed.filter(blog_pk__in=pks)
+
+    published = dict(published.values_list('blog_id', 'commit_id'))
+    indexed = dict(indexed.values_list('blog_pk', 'commit_pk'))
+
+    to_update = [pk for pk, commit_pk in published.items() if indexed.get(pk) != commit_pk]
+    to_remove = [pk for pk in indexed if pk not in published]
+    return to_update, to_remove
+
+
+def update_incrementally(using=DEFAULT_ALIAS, pks=None):
+    to_update, to_remove = get_changes(using, pks)
+    remove_blogs(to_remove, using)
+    for batch in chunked(to_update, 100):
+        index_batch((using, batch))
+    return to_update, to_remove
+
+
+class IndexQueue(object):
+    """
+    Collects the blogs whose published version changed, and updates the index
+    once no more blogs have been added for a while. A burst of edits to a blog
+    results in a single update.
+
+    The queue only lives in memory, so blogs that are pending when the
+    process exits aren't indexed. IndexedBlog records what is in the index,
+    and ``widgy_blog_reindex --incremental`` catches up from it.
+    """
+    def __init__(self, using=DEFAULT_ALIAS):
+        self.using = using
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.timer = None
+
+    @property
+    def delay(self):
+        return getattr(settings, 'WIDGY_BLOG_INDEX_DELAY', 5)
+
+    def add(self, pk):
+        """
+        Queues `pk` once the current transaction commits, so that the update
+        sees the new version and rolled back changes aren't indexed.
+        """
+        on_commit = getattr(transaction, 'on_commit', None)
+        if on_commit is not None:
+            on_commit(lambda: self._add(pk))
+        else:
+            self._add(pk)
+
+    def _add(self, pk):
+        with self.lock:
+            self.pending.add(pk)
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            pks, self.pending = self.pending, set()
+            self.timer = None
+        if pks:
+            try:
+                update_incrementally(self.using, pks)
+            finally:
+                close_db_connections()
+
+
+index_queue = IndexQueue()
@@ -0,0 +1,200 @@
+"""
+Optional timers, query counts and cache hit counts for the phases of a blog
+request, turned on with the ``WIDGY_BLOG_INSTRUMENTATION`` setting.
+
+Every measurement is sent with the ``phase_timed`` and ``cache_checked``
+signals and to the metrics sink named by ``WIDGY_BLOG_METRICS_SINK``. In
+DEBUG mode, the blog views also report them in a ``Server-Timing`` header.
+"""
+import contextlib
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.template.response import TemplateResponse
+
+from widgy.utils import fancy_import
+
+from .signals import phase_timed, cache_checked
+
+_local = threading.local()
+
+
+def is_enabled():
+    return getattr(settings, 'WIDGY_BLOG_INSTRUMENTATION', False)
+
+
+class BaseMetricsSink(object):
+    def timing(self, name, duration, queries):
+        """
+        Records that the phase `name` took `duration` milliseconds and ran
+        `queries` queries.
+        """
+        raise NotImplementedError
+
+    def cache(self, name, hit):
+        """
+        Records a hit or miss of the cache `name`.
+        """
+        raise NotImplementedError
+
+
+class NullMetricsSink(BaseMetricsSink):
+    def timing(self, name, duration, queries):
+        pass
+
+    def cache(self, name, hit):
+        pass
+
+
+class LocMemMetricsSink(BaseMetricsSink):
+    """
+    Keeps the measurements in memory, for tests and development.
+    """
+    def __init__(self):
+        self.timings = []
+        self.hits = {}
+        self.misses = {}
+
+    def timing(self, name, duration, queries):
+        self.timings.append((name, duration, queries))
+
+    def cache(self, name, hit):
+        counts = self.hits if hit else self.misses
+        counts[name] = counts.get(name, 0) + 1
+
+    def hit_rate(self, name):
+        hits = self.hits.get(name, 0)
+        total = hits + self.misses.get(name, 0)
+        return float(hits) / total if total else None
+
+
+_sinks = {}
+
+
+def get_metrics_sink():
+    path = getattr(settings, 'WIDGY_BLOG_METRICS_SINK', 'widgy_blog.instrumentation.NullMetricsSink')
+    try:
+        return _sinks[path]
+    except KeyError:
+        sink = _sinks[path] = fancy_import(path)()
+        return sink
+
+
+class Timings(object):
+    """
+    The measurements taken while it is active, for the Server-Timing header
+    of one response.
+    """
+    def __init__(self):
+        self.phases = []
+        self.caches = []
+
+    @contextlib.contextmanager
+    def activate(self):
+        previous = getattr(_local, 'timings', None)
+        _local.timings = self
+        try:
+            yield self
+        finally:
+            _local.timings = previous
+
+    def header_value(self):
+        entries = []
+        for i, (name, duration, queries) in enumerate(self.phases):
+            # Phases can repeat, and Server-Timing names have to be unique.
+            entries.append('%s-%d;dur=%.1f;desc="%d queries"' % (name, i, duration, queries))
+        for name, hit in self.caches:
+            entries.append('cache-%s;desc="%s"' % (name, 'hit' if hit else 'miss'))
+        return ', '.join(entries)
+
+
+def get_timings():
+    return getattr(_local, 'timings', None)
+
+
+@contextlib.contextmanager
+def measure(name):
+    """
+    Times the block, and counts the queries it runs on the default database.
+    """
+    if not is_enabled():
+        yield
+        return
+
+    # Queries are only logged by debug cursors.
+    force_debug_cursor = connection.force_debug_cursor
+    connection.force_debug_cursor = True
+    queries_before = len(connection.queries_log)
+    start = time.time()
+    try:
+        yield
+    finally:
+        duration = (time.time() - start) * 1000
+        queries = len(connection.queries_log) - queries_before
+        connection.force_debug_cursor = force_debug_cursor
+
+        timings = get_timings()
+        if timings is not None:
+            timings.phases.append((name, duration, queries))
+        get_metrics_sink().timing(name, duration, queries)
+        phase_timed.send(sender=None, name=name, duration=duration, queries=queries)
+
+
+def record_cache(name, hit):
+    if not is_enabled():
+        return
+
+    timings = get_timings()
+    if timings is not None:
+        timings.caches.append((name, hit))
+    get_metrics_sink().cache(name, hit)
+    cache_checked.send(sender=None, name=name, hit=hit)
+
+
+def add_server_timing(response, timings):
+    if settings.DEBUG and (timings.phases or timings.caches):
+        response['Server-Timing'] = timings.header_value()
+    return response
+
+
+class InstrumentedTemplateResponse(TemplateResponse):
+    """
+    Times template rendering, and adds the Server-Timing header once the
+    response is rendered.
+    """
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedTemplateResponse, self).__init__(*args, **kwargs)
+        self.timings = Timings()
+        self.add_post_render_callback(lambda response: add_server_timing(response, self.timings))
+
+    @property
+    def rendered_content(self):
+        with self.timings.activate():
+            with measure('template'):
+                return super(InstrumentedTemplateResponse, self).rendered_content
+
+
+class InstrumentedViewMixin(object):
+    """
+    Collects the measurements of a view into the timings of its response.
+    """
+    @property
+    def response_class(self):
+        return InstrumentedTemplateResponse if is_enabled() else TemplateResponse
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_enabled():
+            return super(InstrumentedViewMixin, self).dispatch(request, *args, **kwargs)
+
+        with Timings().activate() as timings:
+            response = super(InstrumentedViewMixin, self).dispatch(request, *args, **kwargs)
+        if isinstance(response, InstrumentedTemplateResponse):
+            # Template rendering happens later, so the response reports
+            # everything.
+            response.timings.phases[:0] = timings.phases
+            response.timings.caches[:0] = timings.caches
+        else:
+            add_server_timing(response, timings)
+        return response
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from widgy_blog.models import PublishedBlog
+
+
+class Command(BaseCommand):
+    """
+    Copies the title, slug, date and author of the working copy and the
+    published version of every blog onto its row, for blogs created before
+    upgrading, or changed with the signals disconnected.
+    """
+    help = 'Copies the layout fields of blog posts onto the posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of blogs fetched at a time.')
+
+    def handle(self, *args, **options):
+        count = PublishedBlog.get_owner_class().objects.backfill(options['batch_size'])
+        self.stdout.write('%d blog posts.\n' % count)
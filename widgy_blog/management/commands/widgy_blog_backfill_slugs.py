@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from widgy_blog.models import BlogSlug
+
+
+class Command(BaseCommand):
+    """
+    Records the slugs of every published commit, so that links to the old
+    slugs of blogs published before upgrading are redirected.
+    """
+    help = 'Records the slugs that blog posts were published with.'
+
+    def handle(self, *args, **options):
+        BlogSlug.objects.backfill()
+        self.stdout.write('%d blog slugs.\n' % BlogSlug.objects.count())
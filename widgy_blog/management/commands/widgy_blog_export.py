@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import reset_queries
+
+from widgy_blog.transfer import iter_blogs, dump_blog
+
+
+class Command(BaseCommand):
+    """
+    Writes every blog post as JSON Lines, for widgy_blog_import. Blogs are
+    fetched in batches, so memory use doesn't grow with the number of posts.
+    """
+    help = 'Exports blog posts as JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='File to write to, instead of stdout.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of blogs fetched at a time.')
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout, options['batch_size'])
+        else:
+            with open(options['output'], 'w') as f:
+                self.export(f, options['batch_size'])
+
+    def export(self, f, batch_size):
+        for i, blog in enumerate(iter_blogs(batch_size), 1):
+            f.write(dump_blog(blog) + '\n')
+            if i % batch_size == 0:
+                # The query log grows forever in DEBUG mode.
+                reset_queries()
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from widgy_blog.static_site import StaticSite
+
+
+class Command(BaseCommand):
+    """
+    Renders the list pages, tag pages, archives, posts, RSS feeds and sitemap
+    of the blog to a directory, to be served as static files.
+
+    With --incremental, only the pages that the posts published, changed or
+    unpublished since the last export appear on are rendered again. The
+    pages of other posts are kept, even though their sidebars might be out
+    of date.
+    """
+    help = 'Exports the blog as static files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', help='The directory to write to.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes to render with.')
+        parser.add_argument('--incremental', action='store_true', default=False,
+                            help='Only render the pages that changed since the last export.')
+        parser.add_argument('--host', default=None,
+                            help='The host name to render pages for.')
+
+    def handle(self, *args, **options):
+        site = StaticSite(options['output_dir'], options['host'])
+
+        start = time.time()
+        done = 0
+        errors = []
+        for count, batch_errors in site.export(options['workers'], options['incremental']):
+            done += count
+            errors.extend(batch_errors)
+            if options['verbosity'] > 0:
+                self.stdout.write('%d pages rendered (%.1fs)\n' % (done, time.time() - start))
+
+        for url, error in errors:
+            if isinstance(error, int):
+                self.stderr.write('%s returned %d\n' % (url, error))
+            else:
+                self.stderr.write('%s raised %s\n' % (url, error))
+        if errors:
+            raise CommandError('%d pages failed to render.' % len(errors))
+        self.stdout.write('Rendered %d pages in %.1fs.\n' % (done, time.time() - start))
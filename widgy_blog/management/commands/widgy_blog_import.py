@@ -0,0 +1,51 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction, reset_queries
+
+from widgy_blog.models import defer_published_sync
+from widgy_blog.transfer import Importer
+from widgy_blog.utils import chunked
+
+
+class Command(BaseCommand):
+    """
+    Creates blog posts from JSON Lines written by widgy_blog_export. Each
+    batch of posts is imported in its own transaction, and the tables of
+    published posts are rebuilt once at the end instead of after every post.
+    """
+    help = 'Imports blog posts from JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='File to read, or - for stdin.')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of blogs imported per transaction.')
+
+    def handle(self, *args, **options):
+        if options['input'] == '-':
+            count = self.load(sys.stdin, options['batch_size'], options['verbosity'])
+        else:
+            with open(options['input']) as f:
+                count = self.load(f, options['batch_size'], options['verbosity'])
+        self.stdout.write('Imported %d blog posts.\n' % count)
+
+    def load(self, f, batch_size, verbosity=1):
+        importer = Importer()
+        count = 0
+        lines = (line for line in f if line.strip())
+        with defer_published_sync():
+            for batch in chunked(lines, batch_size):
+                with transaction.atomic():
+                    for line in batch:
+                        count += 1
+                        try:
+                            importer.load_blog(line)
+                        except Exception as e:
+                            raise CommandError(
+                                'Blog %d: %s. The batches before it were imported, but they are only '
+                                'published once widgy_blog_rebuild_published runs.' % (count, e)
+                            )
+                reset_queries()
+                if verbosity > 0:
+                    self.stderr.write('%d blog posts imported.\n' % count)
+        return count
@@ -0,0 +1,42 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from widgy_blog.models import PublishedBlog
+
+
+class Command(BaseCommand):
+    """
+    Publishes and expires the blogs whose schedule or commits came due,
+    sending the same signals as publishing them by hand.
+
+    By default it compares every blog's PublishedBlog row with its commits
+    and schedule, so it catches up however long it hasn't run. With
+    --lookback, it only looks at the schedules and commits that came due in
+    that many minutes, which is cheaper but misses anything older; run it
+    without --lookback every so often too. With --interval, it keeps running
+    and checks that often instead.
+    """
+    help = 'Publishes and expires scheduled blog posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookback', type=int, default=None,
+                            help='Only look this many minutes back for schedules that came due.')
+        parser.add_argument('--interval', type=int, default=None,
+                            help='Seconds between checks, to keep running.')
+
+    def handle(self, *args, **options):
+        while True:
+            now = timezone.now()
+            if options['lookback'] is None:
+                blogs = PublishedBlog.objects.reconcile(now)
+            else:
+                lookback = datetime.timedelta(minutes=options['lookback'])
+                blogs = PublishedBlog.objects.sync_scheduled(now - lookback, now)
+            if options['verbosity'] > 0:
+                self.stdout.write('Synced %d scheduled blog posts.\n' % len(blogs))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from widgy_blog.models import PublishedBlog
+
+
+class Command(BaseCommand):
+    """
+    Recreates the PublishedBlog table from the commits of every blog.
+
+    This is necessary after upgrading, and after changing commits without
+    going through the ORM.
+    """
+    help = 'Rebuilds the table of published blog posts.'
+
+    def handle(self, *args, **options):
+        PublishedBlog.objects.rebuild()
+        self.stdout.write('%d published blog posts.\n' % PublishedBlog.objects.count())
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from widgy_blog.models import RelatedBlog
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the related blogs of every published blog.
+
+    This is necessary after upgrading, after changing the
+    WIDGY_BLOG_RELATED_LIMIT or WIDGY_BLOG_RELATED_HALF_LIFE settings, and
+    after deleting tags.
+    """
+    help = 'Rebuilds the table of related blog posts.'
+
+    def handle(self, *args, **options):
+        RelatedBlog.objects.rebuild()
+        self.stdout.write('%d related blog posts.\n' % RelatedBlog.objects.count())
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from widgy_blog.models import BlogDocument
+
+
+class Command(BaseCommand):
+    """
+    Stores the text of every published blog for the built in search.
+
+    This is necessary after turning on WIDGY_BLOG_SEARCH, and after changing
+    widget templates. Only blogs whose published commit changed are rendered
+    again, unless --all is given.
+    """
+    help = 'Rebuilds the documents of the built in blog search.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', default=False,
+                            help='Render every blog again.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            BlogDocument.objects.all().delete()
+        BlogDocument.objects.rebuild()
+        self.stdout.write('%d blog documents.\n' % BlogDocument.objects.count())
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from haystack import DEFAULT_ALIAS
+
+from widgy_blog.indexing import get_index, get_changes, remove_blogs, reindex
+
+
+class Command(BaseCommand):
+    """
+    Updates the search index for every published blog, like haystack's
+    update_index, but in batches spread over several processes.
+
+    With --incremental, only the blogs whose published commit changed since
+    they were indexed are updated, and unpublished blogs are removed.
+    """
+    help = 'Updates the search index of blogs in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes to index with.')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of blogs indexed at a time by a process.')
+        parser.add_argument('--using', default=DEFAULT_ALIAS,
+                            help='The haystack connection to update.')
+        parser.add_argument('--incremental', action='store_true', default=False,
+                            help='Only update blogs that changed since they were indexed.')
+
+    def handle(self, *args, **options):
+        using = options['using']
+        if options['incremental']:
+            pks, to_remove = get_changes(using)
+            remove_blogs(to_remove, using)
+            self.stdout.write('Removed %d blogs.\n' % len(to_remove))
+        else:
+            index = get_index(using)
+            pks = [pk for pk in index.index_queryset(using).values_list('pk', flat=True).distinct()]
+        total = len(pks)
+
+        start = time.time()
+        done = 0
+        for count in reindex(pks, using, options['workers'], options['batch_size']):
+            done += count
+            self.stdout.write(self.format_progress(done, total, time.time() - start))
+
+        self.stdout.write('Indexed %d blogs in %.1fs.\n' % (done, time.time() - start))
+
+    def format_progress(self, done, total, elapsed):
+        rate = done / elapsed if elapsed else 0
+        return '%d/%d blogs indexed (%.1f/s)\n' % (done, total, rate)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgy', '0001_initial'),
+        ('widgy_blog', '0005_auto_20150722_1048'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishedBlog',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('date', models.DateTimeField(db_index=True)),
+                ('slug', models.CharField(max_length=255)),
+                ('blog', models.OneToOneField(related_name='published_blog', to='widgy_blog.Blog')),
+                ('commit', models.ForeignKey(related_name='+', to='widgy.VersionCommit')),
+                ('layout', models.ForeignKey(related_name='+', to='widgy_blog.BlogLayout')),
+            ],
+            options={
+                'verbose_name': 'published blog post',
+                'verbose_name_plural': 'published blog posts',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgy_blog', '0007_archivemonth'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedBlog',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('using', models.CharField(max_length=255)),
+                ('blog_pk', models.PositiveIntegerField()),
+                ('commit_pk', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='indexedblog',
+            unique_together=set([('using', 'blog_pk')]),
+        ),
+    ]
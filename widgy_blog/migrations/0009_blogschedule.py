@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgy_blog', '0008_indexedblog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogSchedule',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('publish_at', models.DateTimeField(help_text='Leave empty to publish the post when it is committed.', null=True, db_index=True, blank=True)),
+                ('expire_at', models.DateTimeField(help_text='Leave empty to keep the post published.', null=True, db_index=True, blank=True)),
+                ('blog', models.OneToOneField(related_name='schedule', to='widgy_blog.Blog')),
+            ],
+            options={
+                'verbose_name': 'schedule',
+                'verbose_name_plural': 'schedules',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgy_blog', '0009_blogschedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedBlog',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('score', models.FloatField()),
+                ('blog', models.ForeignKey(related_name='related_blogs', to='widgy_blog.Blog')),
+                ('related', models.ForeignKey(related_name='+', to='widgy_blog.Blog')),
+            ],
+            options={
+                'ordering': ['-score'],
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='relatedblog',
+            index_together=set([('blog', 'score')]),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import models, migrations, DatabaseError
+
+
+SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE widgy_blog_blogdocument_fts USING fts5(
+        title, text, content='widgy_blog_blogdocument', content_rowid='id'
+    )""",
+    """CREATE TRIGGER widgy_blog_blogdocument_ai AFTER INSERT ON widgy_blog_blogdocument BEGIN
+        INSERT INTO widgy_blog_blogdocument_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END""",
+    """CREATE TRIGGER widgy_blog_blogdocument_ad AFTER DELETE ON widgy_blog_blogdocument BEGIN
+        INSERT INTO widgy_blog_blogdocument_fts(widgy_blog_blogdocument_fts, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+    END""",
+    """CREATE TRIGGER widgy_blog_blogdocument_au AFTER UPDATE ON widgy_blog_blogdocument BEGIN
+        INSERT INTO widgy_blog_blogdocument_fts(widgy_blog_blogdocument_fts, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+        INSERT INTO widgy_blog_blogdocument_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END""",
+]
+
+SQLITE_FTS_DROP = [
+    'DROP TRIGGER IF EXISTS widgy_blog_blogdocument_ai',
+    'DROP TRIGGER IF EXISTS widgy_blog_blogdocument_ad',
+    'DROP TRIGGER IF EXISTS widgy_blog_blogdocument_au',
+    'DROP TABLE IF EXISTS widgy_blog_blogdocument_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        config = getattr(settings, 'WIDGY_BLOG_SEARCH_CONFIG', 'english')
+        schema_editor.execute(
+            "CREATE INDEX widgy_blog_blogdocument_search ON widgy_blog_blogdocument "
+            "USING GIN (to_tsvector('%s'::regconfig, title || ' ' || \"text\"))" % config
+        )
+    elif vendor == 'sqlite':
+        try:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(SQLITE_FTS[0])
+        except DatabaseError:
+            # SQLite was built without FTS5, the simple search is used.
+            return
+        for sql in SQLITE_FTS[1:]:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS widgy_blog_blogdocument_search')
+    elif vendor == 'sqlite':
+        for sql in SQLITE_FTS_DROP:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgy', '0001_initial'),
+        ('widgy_blog', '0010_relatedblog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogDocument',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('title', models.CharField(max_length=1023)),
+                ('slug', models.CharField(max_length=255)),
+                ('date', models.DateTimeField()),
+                ('summary', models.TextField(blank=True)),
+                ('text', models.TextField()),
+                ('blog', models.OneToOneField(related_name='document', to='widgy_blog.Blog')),
+                ('commit', models.ForeignKey(related_name='+', to='widgy.VersionCommit')),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+def record_current_slugs(apps, schema_editor):
+    PublishedBlog = apps.get_model('widgy_blog', 'PublishedBlog')
+    BlogSlug = apps.get_model('widgy_blog', 'BlogSlug')
+    BlogSlug.objects.bulk_create([
+        BlogSlug(blog_id=blog_id, slug=slug)
+        for blog_id, slug in PublishedBlog.objects.values_list('blog_id', 'slug')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgy_blog', '0011_blogdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogSlug',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('slug', models.CharField(max_length=255, db_index=True)),
+                ('published_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('blog', models.ForeignKey(related_name='slugs', to='widgy_blog.Blog')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='blogslug',
+            unique_together=set([('blog', 'slug')]),
+        ),
+        migrations.RunPython(record_current_slugs, migrations.RunPython.noop),
+    ]
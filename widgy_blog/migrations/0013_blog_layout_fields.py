@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('widgy_blog', '0012_blogslug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='working_title',
+            field=models.CharField(max_length=1023, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='working_slug',
+            field=models.CharField(max_length=255, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='working_date',
+            field=models.DateTimeField(null=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='working_author',
+            field=models.ForeignKey(related_name='+', on_delete=django.db.models.deletion.SET_NULL, editable=False, to=settings.AUTH_USER_MODEL, null=True),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='published_title',
+            field=models.CharField(max_length=1023, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='published_slug',
+            field=models.CharField(max_length=255, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='published_date',
+            field=models.DateTimeField(null=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='published_author',
+            field=models.ForeignKey(related_name='+', on_delete=django.db.models.deletion.SET_NULL, editable=False, to=settings.AUTH_USER_MODEL, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.utils import timezone
+
+
+def add_scheduled_syncs(apps, schema_editor):
+    """
+    Records the commits and schedules that are still to come.
+    """
+    Blog = apps.get_model('widgy_blog', 'Blog')
+    BlogSchedule = apps.get_model('widgy_blog', 'BlogSchedule')
+    ScheduledSync = apps.get_model('widgy_blog', 'ScheduledSync')
+    VersionCommit = apps.get_model('widgy', 'VersionCommit')
+    db_alias = schema_editor.connection.alias
+    now = timezone.now()
+
+    rows = []
+    blog_ids = {}
+    for blog_id, content_id in Blog.objects.using(db_alias).values_list('pk', 'content_id'):
+        blog_ids.setdefault(content_id, []).append(blog_id)
+    commits = VersionCommit.objects.using(db_alias).filter(publish_at__gt=now)
+    for tracker_id, publish_at in commits.values_list('tracker_id', 'publish_at'):
+        for blog_id in blog_ids.get(tracker_id, []):
+            rows.append(ScheduledSync(blog_id=blog_id, due_at=publish_at))
+    for schedule in BlogSchedule.objects.using(db_alias).all():
+        for due_at in (schedule.publish_at, schedule.expire_at):
+            if due_at is not None and due_at > now:
+                rows.append(ScheduledSync(blog_id=schedule.blog_id, due_at=due_at))
+    ScheduledSync.objects.using(db_alias).bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgy', '0001_initial'),
+        ('widgy_blog', '0013_blog_layout_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledSync',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('due_at', models.DateTimeField(db_index=True)),
+                ('blog', models.ForeignKey(related_name='+', to='widgy_blog.Blog')),
+            ],
+        ),
+        migrations.RunPython(add_scheduled_syncs, migrations.RunPython.noop),
+    ]
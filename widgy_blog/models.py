@@ -1,10 +1,20 @@
-from django.db import models
+import contextlib
+import heapq
+import threading
+import time
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 from django.template.defaultfilters import slugify
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.encoding import python_2_unicode_compatible
 from django.conf import settings
 from django.core.urlresolvers import reverse
+from django.core.exceptions import ValidationError
 from django.contrib.contenttypes.models import ContentType
 
 from django_extensions.db.fields import AutoSlugField
@@ -13,9 +23,25 @@ import widgy
 from widgy.db.fields import VersionedWidgyField
 from widgy.contrib.page_builder.models import BaseLayout, MainContent, Sidebar, ImageField
 from widgy.utils import QuerySet
-from widgy.models import links
+from widgy.models import links, Node, VersionCommit
 
 from .site import site
+from .utils import chunked, local_month, month_range, related_score
+from .signals import published_blog_changed, published_blogs_rebuilt
+from . import cache, purge, instrumentation
+
+
+def get_layout_fields(prefix, layout):
+    """
+    The fields of `layout` that blogs keep a copy of, named with `prefix`.
+    They are empty if `layout` is None.
+    """
+    return {
+        prefix + 'title': layout.title if layout is not None else '',
+        prefix + 'slug': layout.slug if layout is not None else '',
+        prefix + 'date': layout.date if layout is not None else None,
+        prefix + 'author_id': getattr(layout, 'author_id', None),
+    }
 
 
 @python_2_unicode_compatible
@@ -24,9 +50,77 @@ class AbstractBlog(models.Model):
     preview_url_name = 'blog_detail_preview'
     form_url_name = 'blog_detail_form'
 
+    # Copies of the layout fields of the working copy and of the published
+    # version, so that printing and listing blogs doesn't need their trees.
+    # The receivers at the bottom of this module keep them up to date, and
+    # ``widgy_blog_backfill_blogs`` fills them in.
+    working_title = models.CharField(max_length=1023, blank=True, editable=False)
+    working_slug = models.CharField(max_length=255, blank=True, editable=False)
+    working_date = models.DateTimeField(null=True, editable=False)
+    working_author = models.ForeignKey(getattr(settings, 'AUTH_USER_MODEL', 'auth.User'),
+                                       null=True, editable=False, related_name='+',
+                                       on_delete=models.SET_NULL)
+    published_title = models.CharField(max_length=1023, blank=True, editable=False)
+    published_slug = models.CharField(max_length=255, blank=True, editable=False)
+    published_date = models.DateTimeField(null=True, editable=False)
+    published_author = models.ForeignKey(getattr(settings, 'AUTH_USER_MODEL', 'auth.User'),
+                                         null=True, editable=False, related_name='+',
+                                         on_delete=models.SET_NULL)
+
     class Meta:
         abstract = True
 
+    class QuerySet(QuerySet):
+        def sync_working_copy(self, blog, layout=None):
+            """
+            Copies the fields of the working copy layout of `blog`, or of
+            `layout`, onto its row.
+            """
+            if layout is None:
+                layout = blog.content.working_copy.content
+            self.filter(pk=blog.pk).update(**blog.set_layout_fields('working_', layout))
+
+        def sync_published(self, blog, row):
+            """
+            Copies the fields of the published layout of `blog` onto its row,
+            from its PublishedBlog row, which can be None.
+            """
+            layout = row.layout if row is not None else None
+            self.filter(pk=blog.pk).update(**blog.set_layout_fields('published_', layout))
+
+        def rebuild_published(self):
+            """
+            Copies the fields of every published layout from PublishedBlog.
+            """
+            rows = PublishedBlog.objects.select_related('layout')
+            with transaction.atomic():
+                self.exclude(pk__in=rows.values('blog')).update(**get_layout_fields('published_', None))
+                for row in rows.iterator():
+                    self.filter(pk=row.blog_id).update(**get_layout_fields('published_', row.layout))
+
+        def backfill(self, batch_size=500):
+            """
+            Copies the fields of the working copy and the published layout of
+            every blog onto its row. Returns the number of blogs.
+            """
+            count = 0
+            blogs = self.select_related('content__working_copy', 'published_blog__layout').order_by('pk')
+            for batch in chunked(blogs.iterator(), batch_size):
+                Node.attach_content_instances([blog.content.working_copy for blog in batch])
+                with transaction.atomic():
+                    for blog in batch:
+                        try:
+                            published = blog.published_blog.layout
+                        except PublishedBlog.DoesNotExist:
+                            published = None
+                        fields = blog.set_layout_fields('working_', blog.content.working_copy.content)
+                        fields.update(blog.set_layout_fields('published_', published))
+                        self.filter(pk=blog.pk).update(**fields)
+                count += len(batch)
+            return count
+
+    objects = QuerySet.as_manager()
+
     def get_absolute_url(self):
         # we don't know which version's slug to use, so rely on the
         # automatic redirect
@@ -36,13 +130,26 @@ class AbstractBlog(models.Model):
         return reverse(self.detail_url_name, args=(), kwargs={'pk': self.pk, 'slug': layout.slug})
 
     def __str__(self):
-        layout = self.content.working_copy.content
-        return layout.title or 'untitled'
+        return self.working_title or 'untitled'
 
     # for admin
     @property
     def title(self):
-        return self.content.working_copy.content.title
+        return self.working_title
+
+    @property
+    def author(self):
+        return self.working_author
+
+    def set_layout_fields(self, prefix, layout):
+        """
+        Sets the copies of the fields of `layout` that start with `prefix`,
+        or clears them if `layout` is None. Returns them for update().
+        """
+        fields = get_layout_fields(prefix, layout)
+        for name, value in fields.items():
+            setattr(self, name, value)
+        return fields
 
     def get_action_links(self, root_node):
         url = reverse(self.preview_url_name, kwargs={'pk': self.pk, 'root_node_pk': root_node.pk})
@@ -74,9 +181,655 @@ class Blog(AbstractBlog):
         verbose_name = 'blog post'
         verbose_name_plural = 'blog posts'
 
+
+class PublishedBlog(models.Model):
+    """
+    The currently published version of a blog post.
+
+    Finding the published commit of every blog requires an aggregate over all
+    of the commits, so it is stored here instead. Rows are kept up to date
+    whenever a commit is saved or deleted, and can be recreated with the
+    ``widgy_blog_rebuild_published`` management command. Blogs outside of
+    their BlogSchedule don't have a row.
+    """
+    blog = models.OneToOneField(Blog, related_name='published_blog')
+    layout = models.ForeignKey('BlogLayout', related_name='+')
+    commit = models.ForeignKey(VersionCommit, related_name='+')
+    date = models.DateTimeField(db_index=True)
+    slug = models.CharField(max_length=255)
+
+    class Meta:
+        verbose_name = 'published blog post'
+        verbose_name_plural = 'published blog posts'
+
+    # Held in WIDGY_BLOG_CACHE by the process that syncs the blogs that came
+    # due.
+    SYNC_LOCK_KEY = 'widgy_blog:sync_due'
+
+    class QuerySet(QuerySet):
+        def published_commit_ids(self):
+            VersionTracker = site.get_version_tracker_model()
+            return VersionTracker.objects.published().filter(
+                pk__in=self.model.get_owner_class().objects.all().values('content'),
+            ).annotate(
+                max_commit_id=Max('commits__pk'),
+            )
+
+        def make_row(self, blog_id, commit):
+            layout = commit.root_node.content
+            if not isinstance(layout, self.model.get_layout_class()):
+                return None
+            return self.model(
+                blog_id=blog_id,
+                layout=layout,
+                commit=commit,
+                date=layout.date,
+                slug=layout.slug,
+            )
+
+        def sync(self, blog):
+            """
+            Updates the row for `blog` to point at its latest published
+            commit, creating or deleting it as necessary. Returns the row, or
+            None if the blog isn't published.
+            """
+            commit_id = self.published_commit_ids().filter(
+                pk=blog.content_id,
+            ).values_list('max_commit_id', flat=True).first()
+            if commit_id is not None and BlogSchedule.objects.hidden().filter(blog_id=blog.pk).exists():
+                commit_id = None
+
+            current = self.filter(blog_id=blog.pk).first()
+            if current is not None and current.commit_id == commit_id:
+                return current
+
+            row = None
+            with transaction.atomic():
+                if current is not None:
+                    current.delete()
+                if commit_id is not None:
+                    commit = VersionCommit.objects.select_related('root_node').get(pk=commit_id)
+                    row = self.make_row(blog.pk, commit)
+                    if row is not None:
+                        row.save()
+
+            published_blog_changed.send(
+                sender=self.model,
+                blog=blog,
+                previous=current,
+                current=row,
+            )
+            return row
+
+        def rebuild(self):
+            """
+            Recreates every row from the commits.
+            """
+            owners = dict(self.model.get_owner_class().objects.values_list('content', 'pk'))
+            hidden = set(BlogSchedule.objects.hidden().values_list('blog_id', flat=True))
+            commits = VersionCommit.objects.filter(
+                pk__in=self.published_commit_ids().values('max_commit_id'),
+            ).select_related('root_node')
+
+            with transaction.atomic():
+                self.all().delete()
+                for batch in chunked(commits.iterator(), 500):
+                    batch = [commit for commit in batch if owners[commit.tracker_id] not in hidden]
+                    Node.attach_content_instances([commit.root_node for commit in batch])
+                    rows = (self.make_row(owners[commit.tracker_id], commit) for commit in batch)
+                    self.bulk_create([row for row in rows if row is not None])
+
+            published_blogs_rebuilt.send(sender=self.model)
+
+        def sync_due(self, now=None):
+            """
+            Syncs the blogs whose ScheduledSync came due, so that posts
+            scheduled for later are published and expired on time without
+            waiting for widgy_blog_publish_scheduled. Everything that reads
+            the published blogs calls this first. Without `now`, it checks at
+            most once every WIDGY_BLOG_SCHEDULE_CHECK_INTERVAL seconds in a
+            process. Returns the blogs.
+            """
+            if now is None:
+                clock = time.time()
+                if clock < _due_check['next']:
+                    return []
+                _due_check['next'] = clock + getattr(settings, 'WIDGY_BLOG_SCHEDULE_CHECK_INTERVAL', 1)
+                now = timezone.now()
+
+            due = ScheduledSync.objects.filter(due_at__lte=now)
+            if not due.exists():
+                return []
+            store = cache.get_cache()
+            if not store.add(self.model.SYNC_LOCK_KEY, True, 60):
+                # Another process is syncing them.
+                return []
+            try:
+                owner_class = self.model.get_owner_class()
+                with transaction.atomic():
+                    rows = due.values_list('pk', 'blog_id')
+                    pks = [pk for pk, blog_id in rows]
+                    blog_ids = set(blog_id for pk, blog_id in rows)
+                    # Deleted first, so that readers called while syncing
+                    # don't sync them again.
+                    for batch in chunked(pks, 500):
+                        ScheduledSync.objects.filter(pk__in=batch).delete()
+                    blogs = []
+                    for batch in chunked(blog_ids, 500):
+                        blogs.extend(owner_class.objects.filter(pk__in=batch))
+                    for blog in blogs:
+                        self.sync(blog)
+            finally:
+                store.delete(self.model.SYNC_LOCK_KEY)
+            return blogs
+
+        def sync_scheduled(self, since, until=None):
+            """
+            Syncs the blogs whose visibility could have changed between
+            `since` and `until`, because of their BlogSchedule or a commit
+            that was set to be published. Returns the blogs.
+            """
+            if until is None:
+                until = timezone.now()
+            owner_class = self.model.get_owner_class()
+            blog_ids = set(BlogSchedule.objects.changed_between(since, until).values_list('blog_id', flat=True))
+            blog_ids.update(owner_class.objects.filter(
+                content__commits__publish_at__gt=since,
+                content__commits__publish_at__lte=until,
+            ).values_list('pk', flat=True))
+
+            blogs = [blog for blog in owner_class.objects.filter(pk__in=blog_ids)]
+            for blog in blogs:
+                self.sync(blog)
+            ScheduledSync.objects.filter(due_at__gt=since, due_at__lte=until).delete()
+            return blogs
+
+        def reconcile(self, now=None):
+            """
+            Syncs every blog whose row doesn't match its commits and
+            schedule: hidden blogs that still have a row, and blogs whose
+            latest published commit isn't the one in their row. Unlike
+            sync_scheduled, this catches up however long ago blogs came due.
+            Returns the blogs.
+            """
+            if now is None:
+                now = timezone.now()
+            owner_class = self.model.get_owner_class()
+            hidden = set(BlogSchedule.objects.hidden(now).values_list('blog_id', flat=True))
+            owners = dict(owner_class.objects.values_list('content', 'pk'))
+            current = dict(self.values_list('blog_id', 'commit_id'))
+            expected = {}
+            for tracker_id, commit_id in self.published_commit_ids().values_list('pk', 'max_commit_id'):
+                if owners[tracker_id] not in hidden:
+                    expected[owners[tracker_id]] = commit_id
+            # Blogs whose commit isn't a layout have no row, like in sync.
+            layout_class = self.model.get_layout_class()
+            layout_types = set(ct.pk for ct in ContentType.objects.get_for_models(
+                *[model for model in apps.get_models() if issubclass(model, layout_class)]
+            ).values())
+            commit_types = {}
+            for batch in chunked(expected.values(), 500):
+                commit_types.update(VersionCommit.objects.filter(pk__in=batch).values_list(
+                    'pk', 'root_node__content_type',
+                ))
+            expected = dict(
+                (pk, commit_id) for pk, commit_id in expected.items()
+                if commit_types.get(commit_id) in layout_types
+            )
+
+            blog_ids = [pk for pk in set(current) | set(expected) if current.get(pk) != expected.get(pk)]
+            blogs = []
+            for batch in chunked(blog_ids, 500):
+                blogs.extend(owner_class.objects.filter(pk__in=batch))
+            for blog in blogs:
+                self.sync(blog)
+            ScheduledSync.objects.filter(due_at__lte=now).delete()
+            return blogs
+
+    objects = QuerySet.as_manager()
+
+    @classmethod
+    def get_owner_class(cls):
+        return cls._meta.get_field('blog').related_model
+
+    @classmethod
+    def get_layout_class(cls):
+        return cls._meta.get_field('layout').related_model
+
+
+class ArchiveMonth(models.Model):
+    """
+    The number of published blog posts in each month, for the archive
+    sidebar. Maintained along with PublishedBlog.
+    """
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        unique_together = [('year', 'month')]
+
+    class QuerySet(QuerySet):
+        def recount(self, year, month):
+            start, end = month_range(year, month)
+            count = PublishedBlog.objects.filter(date__gte=start, date__lt=end).count()
+            if count:
+                self.update_or_create(year=year, month=month, defaults={'count': count})
+            else:
+                self.filter(year=year, month=month).delete()
+
+        def rebuild(self):
+            counts = {}
+            for date in PublishedBlog.objects.values_list('date', flat=True).iterator():
+                month = local_month(date)
+                counts[month] = counts.get(month, 0) + 1
+
+            with transaction.atomic():
+                self.all().delete()
+                self.bulk_create(
+                    self.model(year=year, month=month, count=count)
+                    for (year, month), count in counts.items()
+                )
+
+    objects = QuerySet.as_manager()
+
+
+class BlogSchedule(models.Model):
+    """
+    When a blog post becomes visible and when it expires. The blog is only
+    published between the two, which the ``widgy_blog_publish_scheduled``
+    management command checks for.
+    """
+    blog = models.OneToOneField(Blog, related_name='schedule')
+    publish_at = models.DateTimeField(null=True, blank=True, db_index=True,
+                                      help_text='Leave empty to publish the post when it is committed.')
+    expire_at = models.DateTimeField(null=True, blank=True, db_index=True,
+                                     help_text='Leave empty to keep the post published.')
+
+    class Meta:
+        verbose_name = 'schedule'
+        verbose_name_plural = 'schedules'
+
+    class QuerySet(QuerySet):
+        def hidden(self, now=None):
+            if now is None:
+                now = timezone.now()
+            return self.filter(models.Q(publish_at__gt=now) | models.Q(expire_at__lte=now))
+
+        def changed_between(self, since, until):
+            return self.filter(
+                models.Q(publish_at__gt=since, publish_at__lte=until) |
+                models.Q(expire_at__gt=since, expire_at__lte=until)
+            )
+
+    objects = QuerySet.as_manager()
+
+    def clean(self):
+        if self.publish_at and self.expire_at and self.expire_at <= self.publish_at:
+            raise ValidationError('The post has to expire after it is published.')
+
+    def is_visible(self, now=None):
+        if now is None:
+            now = timezone.now()
+        return ((self.publish_at is None or self.publish_at <= now) and
+                (self.expire_at is None or self.expire_at > now))
+
+
+class ScheduledSync(models.Model):
+    """
+    A time when the published version of a blog changes by itself, because a
+    commit was saved with a later publish_at, or its BlogSchedule starts or
+    ends then. PublishedBlog.objects.sync_due syncs the blog once the time
+    comes.
+    """
+    blog = models.ForeignKey(Blog, related_name='+')
+    due_at = models.DateTimeField(db_index=True)
+
+    class QuerySet(QuerySet):
+        def add(self, blog_ids, due_at):
+            if due_at is None or due_at <= timezone.now():
+                return
+            self.bulk_create([self.model(blog_id=blog_id, due_at=due_at) for blog_id in blog_ids])
+
+    objects = QuerySet.as_manager()
+
+
+class RelatedBlog(models.Model):
+    """
+    The published blogs most related to each published blog, by how many
+    tags they share and how close together they were published. Maintained
+    along with PublishedBlog and the tags of published layouts, and recreated
+    by the ``widgy_blog_rebuild_related`` management command.
+    """
+    blog = models.ForeignKey(Blog, related_name='related_blogs')
+    related = models.ForeignKey(Blog, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        index_together = [('blog', 'score')]
+        ordering = ['-score']
+
+    class QuerySet(QuerySet):
+        def for_blog(self, blog_id, limit=None):
+            """
+            The related blogs of `blog_id`, best first, with their published
+            layouts.
+            """
+            qs = self.filter(blog_id=blog_id).select_related(
+                'related__published_blog__layout',
+            ).order_by('-score')
+            if limit is not None:
+                qs = qs[:limit]
+            return qs
+
+        def get_published_tags(self, blog_ids=None, tag_ids=None):
+            """
+            Maps the ids of published blogs to their date and the set of their
+            tag ids. Only includes `blog_ids`, or the blogs with any of
+            `tag_ids`, when either is given.
+            """
+            if blog_ids is not None:
+                querysets = (
+                    PublishedBlog.objects.filter(blog_id__in=batch) for batch in chunked(blog_ids, 500)
+                )
+            elif tag_ids is not None:
+                querysets = (
+                    PublishedBlog.objects.filter(layout__tags__in=batch).distinct()
+                    for batch in chunked(tag_ids, 500)
+                )
+            else:
+                querysets = [PublishedBlog.objects.all()]
+
+            blogs = {}
+            for published in querysets:
+                layouts = {}
+                for blog_id, layout_id, date in published.values_list('blog_id', 'layout_id', 'date'):
+                    blogs[blog_id] = (date, set())
+                    layouts[layout_id] = blog_id
+                through = BlogLayout.tags.through.objects.filter(
+                    bloglayout_id__in=published.values('layout'),
+                ).values_list('bloglayout_id', 'tag_id')
+                for layout_id, tag_id in through:
+                    blogs[layouts[layout_id]][1].add(tag_id)
+            return blogs
+
+        def get_candidates(self, blogs):
+            """
+            The published blogs that share a tag with any of `blogs`, like
+            get_published_tags.
+            """
+            tag_ids = set(tag_id for date, tags in blogs.values() for tag_id in tags)
+            return self.get_published_tags(tag_ids=tag_ids) if tag_ids else {}
+
+        def make_rows(self, blogs, candidates):
+            """
+            Scores every blog in `blogs` against the `candidates` that share
+            a tag with it, and keeps the best WIDGY_BLOG_RELATED_LIMIT.
+            """
+            limit = getattr(settings, 'WIDGY_BLOG_RELATED_LIMIT', 10)
+            half_life = getattr(settings, 'WIDGY_BLOG_RELATED_HALF_LIFE', 365)
+            by_tag = {}
+            for blog_id, (date, tags) in candidates.items():
+                for tag_id in tags:
+                    by_tag.setdefault(tag_id, []).append(blog_id)
+
+            for blog_id, (date, tags) in blogs.items():
+                others = set(other for tag_id in tags for other in by_tag.get(tag_id, ()))
+                others.discard(blog_id)
+                scores = (
+                    (related_score(tags, date, candidates[other][1], candidates[other][0], half_life), other)
+                    for other in others
+                )
+                for score, other in heapq.nlargest(limit, scores):
+                    yield self.model(blog_id=blog_id, related_id=other, score=score)
+
+        def replace(self, blog_ids, rows):
+            with transaction.atomic():
+                for batch in chunked(blog_ids, 500):
+                    self.filter(blog_id__in=batch).delete()
+                self.bulk_create(rows)
+
+        def update(self, blog_ids):
+            """
+            Recomputes the related blogs of `blog_ids`.
+            """
+            blogs = self.get_published_tags(blog_ids=blog_ids)
+            self.replace(blog_ids, self.make_rows(blogs, self.get_candidates(blogs)))
+
+        def add_to_lists(self, blogs, candidates):
+            """
+            Adds each of `blogs` to the related blogs of the `candidates` that
+            share a tag with it, where it beats the worst of them. The
+            candidates' lists must not contain `blogs` already. Returns the
+            ids of the candidates whose lists changed.
+            """
+            limit = getattr(settings, 'WIDGY_BLOG_RELATED_LIMIT', 10)
+            half_life = getattr(settings, 'WIDGY_BLOG_RELATED_HALF_LIFE', 365)
+            by_tag = {}
+            for blog_id, (date, tags) in candidates.items():
+                for tag_id in tags:
+                    by_tag.setdefault(tag_id, []).append(blog_id)
+
+            new_scores = {}
+            for blog_id, (date, tags) in blogs.items():
+                others = set(other for tag_id in tags for other in by_tag.get(tag_id, ()))
+                others.discard(blog_id)
+                for other in others:
+                    other_date, other_tags = candidates[other]
+                    score = related_score(other_tags, other_date, tags, date, half_life)
+                    new_scores.setdefault(other, []).append((score, blog_id, None))
+
+            changed = set()
+            to_delete = []
+            to_create = []
+            for batch in chunked(new_scores, 500):
+                current = {}
+                rows = self.filter(blog_id__in=batch).values_list('pk', 'blog_id', 'related_id', 'score')
+                for pk, blog_id, related_id, score in rows:
+                    current.setdefault(blog_id, []).append((score, related_id, pk))
+                for blog_id in batch:
+                    existing = current.get(blog_id, [])
+                    best = heapq.nlargest(limit, existing + new_scores[blog_id], key=lambda row: row[0])
+                    if all(pk is not None for score, related_id, pk in best):
+                        continue
+                    changed.add(blog_id)
+                    kept = set(pk for score, related_id, pk in best)
+                    to_delete.extend(pk for score, related_id, pk in existing if pk not in kept)
+                    to_create.extend(
+                        self.model(blog_id=blog_id, related_id=related_id, score=score)
+                        for score, related_id, pk in best if pk is None
+                    )
+
+            with transaction.atomic():
+                for batch in chunked(to_delete, 500):
+                    self.filter(pk__in=batch).delete()
+                self.bulk_create(to_create)
+            return changed
+
+        def update_around(self, blog_ids):
+            """
+            Updates the related blogs after the tags or published versions of
+            `blog_ids` changed. Their own lists are recomputed, and so are
+            the lists that contained them. Other blogs that share a tag with
+            them only have them added, if they score better than the worst
+            blog already there. Returns the ids of the blogs whose lists
+            could have changed.
+            """
+            blog_ids = set(blog_ids)
+            containing = set()
+            for batch in chunked(blog_ids, 500):
+                containing.update(self.filter(related_id__in=batch).values_list('blog_id', flat=True))
+            containing -= blog_ids
+
+            blogs = self.get_published_tags(blog_ids=blog_ids)
+            candidates = self.get_candidates(blogs)
+            others = dict(
+                (pk, value) for pk, value in candidates.items()
+                if pk not in blog_ids and pk not in containing
+            )
+            with transaction.atomic():
+                added = self.add_to_lists(blogs, others)
+                self.replace(blog_ids, self.make_rows(blogs, candidates))
+                self.update(containing)
+            return blog_ids | containing | added
+
+        def rebuild(self):
+            """
+            Recreates every row from the published blogs.
+            """
+            blogs = self.get_published_tags()
+            with transaction.atomic():
+                self.all().delete()
+                for batch in chunked(self.make_rows(blogs, blogs), 500):
+                    self.bulk_create(batch)
+
+    objects = QuerySet.as_manager()
+
     @property
-    def author(self):
-        return self.content.working_copy.content.author
+    def layout(self):
+        return self.related.published_blog.layout
+
+    @property
+    def title(self):
+        return self.layout.title
+
+    def get_absolute_url(self):
+        return self.related.get_absolute_url_with_layout(self.layout)
+
+
+class BlogDocument(models.Model):
+    """
+    The plain text of each published blog, for the built in search. Stored
+    when blogs are published if ``WIDGY_BLOG_SEARCH`` is on, along with what
+    the results page shows.
+    """
+    blog = models.OneToOneField(Blog, related_name='document')
+    commit = models.ForeignKey(VersionCommit, related_name='+')
+    title = models.CharField(max_length=1023)
+    slug = models.CharField(max_length=255)
+    date = models.DateTimeField()
+    summary = models.TextField(blank=True)
+    text = models.TextField()
+
+    class QuerySet(QuerySet):
+        def sync(self, blog, row):
+            """
+            Updates the document of `blog` from its PublishedBlog `row`, or
+            deletes it if `row` is None.
+            """
+            from .documents import get_plaintext
+
+            if row is None:
+                self.filter(blog_id=blog.pk).delete()
+                return None
+            document = self.filter(blog_id=blog.pk).first() or self.model(blog=blog)
+            if document.commit_id == row.commit_id:
+                return document
+
+            layout = row.layout
+            document.commit_id = row.commit_id
+            document.title = layout.title
+            document.slug = layout.slug
+            document.date = layout.date
+            document.summary = layout.summary or ''
+            document.text = get_plaintext(blog, row.commit.root_node)
+            document.save()
+            return document
+
+        def rebuild(self):
+            """
+            Updates the documents of the blogs whose published commit changed,
+            and deletes the ones of unpublished blogs.
+            """
+            self.exclude(blog_id__in=PublishedBlog.objects.values('blog')).delete()
+            existing = dict(self.values_list('blog_id', 'commit_id'))
+            rows = PublishedBlog.objects.select_related('blog', 'commit__root_node', 'layout')
+            for row in rows.iterator():
+                if existing.get(row.blog_id) != row.commit_id:
+                    row.commit.root_node.content = row.layout
+                    self.sync(row.blog, row)
+
+    objects = QuerySet.as_manager()
+
+    def get_absolute_url(self):
+        return reverse(PublishedBlog.get_owner_class().detail_url_name,
+                       kwargs={'pk': self.blog_id, 'slug': self.slug})
+
+
+class BlogSlug(models.Model):
+    """
+    Every slug that each blog has been published with, so that links with
+    old slugs, or without the pk, can be redirected to the current URL.
+    """
+    blog = models.ForeignKey(Blog, related_name='slugs')
+    slug = models.CharField(max_length=255, db_index=True)
+    published_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [('blog', 'slug')]
+
+    class QuerySet(QuerySet):
+        def record(self, blog_id, slug):
+            if not self.filter(blog_id=blog_id, slug=slug).update(published_at=timezone.now()):
+                self.create(blog_id=blog_id, slug=slug)
+
+        def find(self, slug):
+            """
+            The pk and current slug of the published blog that most recently
+            had `slug`, or None.
+            """
+            return self.filter(
+                slug=slug,
+                blog__published_blog__isnull=False,
+            ).order_by('-published_at').values_list('blog_id', 'blog__published_blog__slug').first()
+
+        def add_missing(self, pairs):
+            existing = set(self.values_list('blog_id', 'slug'))
+            for batch in chunked((pair for pair in pairs if pair not in existing), 500):
+                self.bulk_create([self.model(blog_id=blog_id, slug=slug) for blog_id, slug in batch])
+
+        def rebuild(self):
+            """
+            Records the current slug of every published blog.
+            """
+            self.add_missing(PublishedBlog.objects.values_list('blog_id', 'slug').iterator())
+
+        def backfill(self):
+            """
+            Records the slugs of every published commit, for blogs that were
+            published before slugs were recorded.
+            """
+            layout_class = PublishedBlog.get_layout_class()
+            content_type = ContentType.objects.get_for_model(layout_class, for_concrete_model=False)
+            layouts = PublishedBlog.get_owner_class().objects.filter(
+                content__commits__root_node__content_type=content_type,
+                content__commits__publish_at__lte=timezone.now(),
+            ).values_list('content__commits__root_node__content_id', 'pk')
+
+            def pairs():
+                for batch in chunked(layouts.iterator(), 500):
+                    owners = dict(batch)
+                    slugs = layout_class.objects.filter(pk__in=owners.keys()).values_list('pk', 'slug')
+                    for layout_id, slug in slugs:
+                        yield owners[layout_id], slug
+            self.add_missing(set(pairs()))
+
+    objects = QuerySet.as_manager()
+
+
+class IndexedBlog(models.Model):
+    """
+    The commit of each blog that is in the search index, so that the index
+    can be updated incrementally. These aren't foreign keys because the rows
+    have to outlive deleted blogs, so they can be removed from the index.
+    """
+    using = models.CharField(max_length=255)
+    blog_pk = models.PositiveIntegerField()
+    commit_pk = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [('using', 'blog_pk')]
 
 
 class AbstractBlogLayout(BaseLayout):
@@ -93,21 +846,63 @@ class AbstractBlogLayout(BaseLayout):
     page_title = models.CharField(max_length=255, blank=True, null=True,
                                   help_text='Will default to the blog title')
     owner_class = Blog
+    published_class = PublishedBlog
+    # Used by QuerySet.eager()
+    eager_select_related = ()
+    eager_prefetch_related = ()
 
     class QuerySet(QuerySet):
+        _with_owners = False
+
         def published(self):
-            from django.db.models import Max
-            from widgy.models import Node
+            if not self.model.has_published_table():
+                VersionTracker = site.get_version_tracker_model()
+                published_commit_ids = VersionTracker.objects.published().annotate(
+                    max_commit_id=Max('commits__pk'),
+                ).filter(
+                    pk__in=self.model.owner_class.objects.all().values('content'),
+                ).values('max_commit_id')
+                return self.filter(_nodes__versioncommit__pk__in=published_commit_ids)
 
-            # put this query in widgy
-            VersionTracker = site.get_version_tracker_model()
-            published_commit_ids = VersionTracker.objects.published().annotate(
-                max_commit_id=Max('commits__pk'),
-            ).filter(
-                pk__in=self.model.owner_class.objects.all().values('content'),
-            ).values('max_commit_id')
+            published_blogs = self.model.published_class.objects
+            published_blogs.sync_due()
+            return self.filter(pk__in=published_blogs.values('layout'))
+
+        def eager(self):
+            """
+            Load the related objects that are displayed along with each blog
+            post, so that listing them costs the same number of queries
+            regardless of their number.
+            """
+            qs = self
+            if self.model.eager_select_related:
+                qs = qs.select_related(*self.model.eager_select_related)
+            if self.model.eager_prefetch_related:
+                qs = qs.prefetch_related(*self.model.eager_prefetch_related)
+            return qs
+
+        def with_owners(self):
+            """
+            Fetch the owner of every layout when the queryset is evaluated,
+            instead of with one query per layout.
+            """
+            clone = self._clone()
+            clone._with_owners = True
+            return clone
+
+        def _clone(self, *args, **kwargs):
+            clone = super(AbstractBlogLayout.QuerySet, self)._clone(*args, **kwargs)
+            clone._with_owners = self._with_owners
+            return clone
 
-            return self.model.objects.filter(_nodes__versioncommit__pk__in=published_commit_ids)
+        def _fetch_all(self):
+            if self._result_cache is not None:
+                return super(AbstractBlogLayout.QuerySet, self)._fetch_all()
+            with instrumentation.measure('layouts'):
+                super(AbstractBlogLayout.QuerySet, self)._fetch_all()
+                if self._with_owners:
+                    # values() querysets share this class
+                    self.model.attach_owners([i for i in self._result_cache if isinstance(i, self.model)])
 
     objects = QuerySet.as_manager()
 
@@ -142,6 +937,55 @@ class AbstractBlogLayout(BaseLayout):
             kwargs={'pk': self.owner.pk, 'slug': self.slug}
         )
 
+    @classmethod
+    def attach_owners(cls, layouts):
+        """
+        Given a list of layouts, fill in each one's `owner`. Efficiently.
+        """
+        needed_layouts = [i for i in layouts if 'owner' not in i.__dict__]
+        if not needed_layouts:
+            return layouts
+
+        with instrumentation.measure('owners'):
+            cls._attach_owners(needed_layouts)
+        return layouts
+
+    @classmethod
+    def _attach_owners(cls, needed_layouts):
+        published = cls.published_class.objects.filter(
+            layout__in=needed_layouts,
+        ).select_related('blog')
+        owners = dict((row.layout_id, row.blog) for row in published)
+
+        # Unpublished layouts (working copies and old commits) have to be
+        # found through the commits.
+        missing_ids = [i.pk for i in needed_layouts if i.pk not in owners]
+        if missing_ids:
+            content_type = ContentType.objects.get_for_model(cls, for_concrete_model=False)
+            owner_ids = dict(cls.owner_class.objects.filter(
+                content__commits__root_node__content_id__in=missing_ids,
+                content__commits__root_node__content_type=content_type,
+            ).values_list('content__commits__root_node__content_id', 'pk').distinct())
+            owners_by_pk = cls.owner_class.objects.in_bulk(set(owner_ids.values()))
+            for layout_id, owner_id in owner_ids.items():
+                owners[layout_id] = owners_by_pk[owner_id]
+
+        for layout in needed_layouts:
+            if layout.pk in owners:
+                layout.owner = owners[layout.pk]
+
+    @classmethod
+    def has_published_table(cls):
+        """
+        Whether published_class stores the published versions of this layout
+        class and its owner_class. For other subclasses, published() finds
+        them from the commits like before the table existed.
+        """
+        published_class = cls.published_class
+        return (published_class is not None and
+                published_class.get_layout_class() is cls._meta.concrete_model and
+                published_class.get_owner_class() is cls.owner_class)
+
     @cached_property
     def owner(self):
         content_type = ContentType.objects.get_for_model(self, for_concrete_model=False)
@@ -157,14 +1001,245 @@ class BlogLayout(AbstractBlogLayout):
     image = ImageField(blank=True, null=True)
     tags = models.ManyToManyField('Tag', blank=True)
 
+    eager_select_related = ('author', 'image')
+    eager_prefetch_related = ('tags',)
+
+    def clone(self):
+        # widgy doesn't copy many to many fields, and committed versions need
+        # their tags.
+        new = super(BlogLayout, self).clone()
+        new.tags.add(*self.tags.all())
+        return new
+
 
 @python_2_unicode_compatible
 class Tag(models.Model):
     name = models.CharField(unique=True, max_length=100)
     slug = AutoSlugField(populate_from='name', unique=True)
 
+    class QuerySet(QuerySet):
+        def cloud(self, limit=None):
+            """
+            The tags of published blogs, annotated with the number of
+            published blogs in `published_count`, most used first.
+            """
+            qs = self.filter(
+                bloglayout__pk__in=BlogLayout.published_class.objects.values('layout'),
+            ).annotate(
+                published_count=Count('bloglayout'),
+            ).order_by('-published_count', 'name')
+            if limit is not None:
+                qs = qs[:limit]
+            return qs
+
+    objects = QuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     def get_absolute_url(self):
         return reverse('blog_tag', kwargs={'tag': self.slug})
+
+
+_deferred_sync = threading.local()
+# When PublishedBlog.objects.sync_due next checks for blogs that came due.
+_due_check = {'next': 0}
+
+
+@contextlib.contextmanager
+def defer_published_sync():
+    """
+    Skips syncing PublishedBlog as commits are saved, and rebuilds it once at
+    the end instead. For bulk changes, like imports. Nothing is rebuilt if
+    the block raises, so that a failed import doesn't set off every rebuild
+    and purge; run ``widgy_blog_rebuild_published`` once it is fixed.
+    """
+    _deferred_sync.active = True
+    try:
+        yield
+    finally:
+        _deferred_sync.active = False
+    PublishedBlog.objects.rebuild()
+
+
+@receiver([post_save, post_delete])
+def sync_published_blog(sender, instance, **kwargs):
+    """
+    Keeps PublishedBlog up to date when commits are made, approved, or
+    deleted.
+    """
+    if kwargs.get('raw') or not isinstance(instance, VersionCommit):
+        return
+    blogs = PublishedBlog.get_owner_class().objects.filter(content_id=instance.tracker_id)
+    if kwargs.get('signal') is post_save:
+        ScheduledSync.objects.add(blogs.values_list('pk', flat=True), instance.publish_at)
+    if getattr(_deferred_sync, 'active', False):
+        return
+    for blog in blogs:
+        PublishedBlog.objects.sync(blog)
+
+
+@receiver(post_save, sender=BlogSchedule)
+def sync_scheduled_blog(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        PublishedBlog.objects.sync(instance.blog)
+        for due_at in (instance.publish_at, instance.expire_at):
+            ScheduledSync.objects.add([instance.blog_id], due_at)
+
+
+@receiver(post_delete, sender=BlogSchedule)
+def sync_unscheduled_blog(sender, instance, **kwargs):
+    def sync():
+        # The blog is gone if the schedule was deleted along with it.
+        for blog in PublishedBlog.get_owner_class().objects.filter(pk=instance.blog_id):
+            PublishedBlog.objects.sync(blog)
+
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is not None:
+        on_commit(sync)
+    else:
+        sync()
+
+
+@receiver(post_save)
+def sync_working_copy_fields(sender, instance, **kwargs):
+    """
+    Keeps the copies of the working copy's fields on blogs up to date when
+    its layout is saved, or when a commit is reverted to.
+    """
+    if kwargs.get('raw'):
+        return
+    if isinstance(instance, AbstractBlogLayout):
+        content_type = ContentType.objects.get_for_model(instance, for_concrete_model=False)
+        instance.owner_class.objects.filter(
+            content__working_copy__content_id=instance.pk,
+            content__working_copy__content_type=content_type,
+        ).update(**get_layout_fields('working_', instance))
+    elif isinstance(instance, site.get_version_tracker_model()):
+        owner_class = PublishedBlog.get_owner_class()
+        for blog in owner_class.objects.filter(content=instance):
+            owner_class.objects.sync_working_copy(blog, instance.working_copy.content)
+
+
+@receiver(published_blog_changed)
+def sync_published_fields(sender, blog, current, **kwargs):
+    type(blog).objects.sync_published(blog, current)
+
+
+@receiver(published_blogs_rebuilt)
+def rebuild_published_fields(sender, **kwargs):
+    PublishedBlog.get_owner_class().objects.rebuild_published()
+
+
+@receiver(published_blog_changed)
+def recount_archive_months(sender, previous, current, **kwargs):
+    months = set(local_month(row.date) for row in (previous, current) if row is not None)
+    for year, month in months:
+        ArchiveMonth.objects.recount(year, month)
+
+
+@receiver(published_blogs_rebuilt)
+def rebuild_archive_months(sender, **kwargs):
+    ArchiveMonth.objects.rebuild()
+
+
+@receiver(published_blog_changed)
+def update_related_blogs(sender, blog, **kwargs):
+    changed = RelatedBlog.objects.update_around([blog.pk])
+    changed.discard(blog.pk)
+    if changed:
+        # The pages of the other blogs show their related posts.
+        purge.purge(purge.blog_key(pk) for pk in changed)
+
+
+@receiver(published_blogs_rebuilt)
+def rebuild_related_blogs(sender, **kwargs):
+    RelatedBlog.objects.rebuild()
+
+
+@receiver(published_blog_changed)
+@receiver(published_blogs_rebuilt)
+def invalidate_cache(sender, **kwargs):
+    cache.invalidate()
+
+
+@receiver(published_blog_changed)
+def queue_reindex(sender, blog, **kwargs):
+    if getattr(settings, 'WIDGY_BLOG_INDEX_ON_PUBLISH', False):
+        from .indexing import index_queue
+        index_queue.add(blog.pk)
+
+
+@receiver(published_blog_changed)
+def record_slug(sender, blog, current, **kwargs):
+    if current is not None:
+        BlogSlug.objects.record(blog.pk, current.slug)
+
+
+@receiver(published_blogs_rebuilt)
+def record_slugs(sender, **kwargs):
+    BlogSlug.objects.rebuild()
+
+
+@receiver(published_blog_changed)
+def update_search_document(sender, blog, current, **kwargs):
+    if getattr(settings, 'WIDGY_BLOG_SEARCH', False):
+        BlogDocument.objects.sync(blog, current)
+
+
+@receiver(published_blogs_rebuilt)
+def rebuild_search_documents(sender, **kwargs):
+    if getattr(settings, 'WIDGY_BLOG_SEARCH', False):
+        BlogDocument.objects.rebuild()
+
+
+@receiver(published_blog_changed)
+def purge_published_blog(sender, blog, previous, current, **kwargs):
+    purge.purge_published_blog(blog, previous, current)
+
+
+@receiver(published_blogs_rebuilt)
+def purge_all(sender, **kwargs):
+    purge.purge_all()
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def purge_tag(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        purge.purge_tag(instance)
+        cache.invalidate()
+
+
+@receiver(m2m_changed, sender=BlogLayout.tags.through)
+def invalidate_published_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # post_clear doesn't say which layouts lost the tag.
+        instance._cleared_layout_ids = list(
+            sender.objects.filter(tag_id=instance.pk).values_list('bloglayout_id', flat=True)
+        )
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        if action == 'post_clear':
+            layout_ids = instance.__dict__.pop('_cleared_layout_ids', ())
+        else:
+            layout_ids = pk_set or ()
+    else:
+        layout_ids = [instance.pk]
+    # Only working copies are usually edited, and they don't matter.
+    blog_ids = set(PublishedBlog.objects.filter(layout_id__in=layout_ids).values_list('blog_id', flat=True))
+    if reverse or blog_ids:
+        cache.invalidate()
+    if blog_ids:
+        # The pages of the blogs whose related posts changed show the tags
+        # too.
+        blog_ids.update(RelatedBlog.objects.update_around(blog_ids))
+        if reverse:
+            tag_slugs = [instance.slug]
+        elif pk_set is not None:
+            tag_slugs = Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True)
+        else:
+            # Cleared, and the tags that were removed are gone.
+            purge.purge_all()
+            return
+        purge.purge_blog_tags(blog_ids, tag_slugs)
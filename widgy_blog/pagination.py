@@ -0,0 +1,102 @@
+"""
+Keyset pagination for blog lists.
+
+Instead of page numbers, pages are identified by an opaque cursor pointing at
+the first or last blog post of a neighboring page, so every page costs the
+same, however deep it is, and no count is needed.
+"""
+import base64
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_text
+
+
+def encode_cursor(obj):
+    value = '%s|%s' % (obj.date.isoformat(), obj.pk)
+    return force_text(base64.urlsafe_b64encode(force_bytes(value))).rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        value = force_text(base64.urlsafe_b64decode(force_bytes(cursor + padding)))
+        date, pk = value.split('|')
+        date = parse_datetime(date)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise InvalidPage('Invalid cursor')
+    if date is None:
+        raise InvalidPage('Invalid cursor')
+    return date, pk
+
+
+class KeysetPage(object):
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous() and self.object_list:
+            return encode_cursor(self.object_list[0])
+
+    @property
+    def next_cursor(self):
+        if self.has_next() and self.object_list:
+            return encode_cursor(self.object_list[-1])
+
+
+class KeysetPaginator(object):
+    """
+    Paginates a queryset of blog layouts by (date, pk), newest first.
+    """
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def page(self, after=None, before=None):
+        """
+        The page following the cursor `after`, or preceding the cursor
+        `before`. Without either, the first page.
+        """
+        qs = self.queryset
+        if before is not None:
+            date, pk = decode_cursor(before)
+            qs = qs.filter(Q(date__gt=date) | Q(date=date, pk__gt=pk)).order_by('date', 'pk')
+        else:
+            qs = qs.order_by('-date', '-pk')
+            if after is not None:
+                date, pk = decode_cursor(after)
+                qs = qs.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+
+        # Fetch one extra object to find out if there is another page.
+        object_list = [obj for obj in qs[:self.per_page + 1]]
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if before is not None:
+            object_list.reverse()
+            return KeysetPage(object_list, self, has_previous=has_more, has_next=True)
+        else:
+            return KeysetPage(object_list, self, has_previous=after is not None, has_next=has_more)
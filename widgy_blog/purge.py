@@ -0,0 +1,142 @@
+"""
+Cache tags for the responses of the blog views, so that a caching reverse
+proxy can purge exactly the pages that change when a blog is published.
+
+The views add the tags to a ``Surrogate-Key`` header, and the purge backend
+named by the ``WIDGY_BLOG_PURGE_BACKEND`` setting is told which tags to purge.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from widgy.utils import fancy_import
+
+from .utils import local_month
+
+# On every response from the blog views.
+ALL_KEY = 'blog'
+# Pages that list blogs, and pages with the archive and tag sidebars, which
+# change whenever anything is published.
+LIST_KEY = 'blog-list'
+FEED_KEY = 'blog-feed'
+SITEMAP_KEY = 'blog-sitemap'
+
+
+def blog_key(pk):
+    return 'blog-%s' % pk
+
+
+def tag_key(slug):
+    return 'blog-tag-%s' % slug
+
+
+def archive_key(year, month=None):
+    if month is None:
+        return 'blog-archive-%s' % year
+    return 'blog-archive-%s-%02d' % (year, int(month))
+
+
+def add_surrogate_keys(response, keys):
+    header = getattr(settings, 'WIDGY_BLOG_SURROGATE_KEY_HEADER', 'Surrogate-Key')
+    keys = [ALL_KEY] + [key for key in keys if key != ALL_KEY]
+    if response.has_header(header):
+        keys = response[header].split() + keys
+    response[header] = ' '.join(sorted(set(keys), key=keys.index))
+    return response
+
+
+class SurrogateKeyMixin(object):
+    """
+    Adds the keys from get_surrogate_keys to the responses of a view.
+    """
+    def get_surrogate_keys(self):
+        return []
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super(SurrogateKeyMixin, self).dispatch(request, *args, **kwargs)
+        return add_surrogate_keys(response, self.get_surrogate_keys())
+
+
+class BasePurgeBackend(object):
+    def purge(self, keys):
+        """
+        Purges everything tagged with any of `keys` from the cache.
+        """
+        raise NotImplementedError
+
+
+class NullPurgeBackend(BasePurgeBackend):
+    def purge(self, keys):
+        pass
+
+
+class LocMemPurgeBackend(BasePurgeBackend):
+    """
+    Remembers the keys that were purged instead of purging them, for tests
+    and development.
+    """
+    def __init__(self):
+        self.purged = []
+
+    def purge(self, keys):
+        self.purged.append(set(keys))
+
+    def clear(self):
+        self.purged = []
+
+
+_backends = {}
+
+
+def get_purge_backend():
+    path = getattr(settings, 'WIDGY_BLOG_PURGE_BACKEND', 'widgy_blog.purge.NullPurgeBackend')
+    try:
+        return _backends[path]
+    except KeyError:
+        backend = _backends[path] = fancy_import(path)()
+        return backend
+
+
+def purge(keys):
+    keys = set(keys)
+    backend = get_purge_backend()
+    # Purge after the transaction commits, or the proxy could cache the old
+    # version again.
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is not None:
+        on_commit(lambda: backend.purge(keys))
+    else:
+        backend.purge(keys)
+
+
+def get_published_blog_keys(row):
+    year, month = local_month(row.date)
+    keys = set([blog_key(row.blog_id), archive_key(year), archive_key(year, month)])
+    keys.update(tag_key(slug) for slug in row.layout.tags.values_list('slug', flat=True))
+    return keys
+
+
+def purge_published_blog(blog, previous, current):
+    keys = set([blog_key(blog.pk), LIST_KEY, FEED_KEY, SITEMAP_KEY])
+    for row in (previous, current):
+        if row is not None:
+            keys.update(get_published_blog_keys(row))
+    purge(keys)
+
+
+def purge_all():
+    purge([ALL_KEY])
+
+
+def purge_tag(tag):
+    purge([tag_key(tag.slug), LIST_KEY, FEED_KEY])
+
+
+def purge_blog_tags(blog_ids, tag_slugs):
+    """
+    Purges the pages of published blogs whose tags changed, the pages of the
+    tags, and the lists that show the tag cloud.
+    """
+    keys = set([LIST_KEY, FEED_KEY])
+    keys.update(blog_key(pk) for pk in blog_ids)
+    keys.update(tag_key(slug) for slug in tag_slugs)
+    purge(keys)
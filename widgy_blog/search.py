@@ -0,0 +1,191 @@
+"""
+Searching the BlogDocument table without a search engine, with the full text
+search of the database: a GIN index on PostgreSQL, an FTS5 table on SQLite,
+or plain substring matches elsewhere.
+
+The backend is chosen by the ``WIDGY_BLOG_SEARCH_BACKEND`` setting, or from
+the database when it isn't set.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from widgy.utils import fancy_import
+
+from .models import BlogDocument
+
+TABLE = BlogDocument._meta.db_table
+FTS_TABLE = TABLE + '_fts'
+
+
+def get_words(query):
+    return re.findall(r'\w+', query, re.UNICODE)
+
+
+class SearchResults(object):
+    """
+    The documents matching a query, best first. Slicing only fetches one
+    page, so they can be paginated.
+    """
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+
+    def count(self):
+        try:
+            return self._count
+        except AttributeError:
+            self._count = self.backend.count(self.query)
+            return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = self.count() if key.stop is None else key.stop
+        ids = self.backend.get_ids(self.query, start, max(0, stop - start))
+        documents = BlogDocument.objects.in_bulk(ids)
+        return [documents[pk] for pk in ids if pk in documents]
+
+
+class BaseSearchBackend(object):
+    def search(self, query):
+        return SearchResults(self, query)
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def get_ids(self, query, offset, limit):
+        """
+        The pks of the documents that match `query`, best first.
+        """
+        raise NotImplementedError
+
+
+class RawSearchBackend(BaseSearchBackend):
+    """
+    Runs a WHERE clause and an ORDER BY clause on the documents, which take
+    the query as a parameter.
+    """
+    table = TABLE
+    where = None
+    order_by = None
+
+    def get_query(self, query):
+        raise NotImplementedError
+
+    def count(self, query):
+        query = self.get_query(query)
+        if not query:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM %s WHERE %s' % (self.table, self.where), [query])
+            return cursor.fetchone()[0]
+
+    def get_ids(self, query, offset, limit):
+        query = self.get_query(query)
+        if not query:
+            return []
+        sql = 'SELECT %s FROM %s WHERE %s ORDER BY %s LIMIT %%s OFFSET %%s' % (
+            self.id_column, self.table, self.where, self.order_by,
+        )
+        params = [query] * (1 + self.order_by.count('%s')) + [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(RawSearchBackend):
+    """
+    Uses the GIN index on the title and text of the documents, created in
+    the language of the ``WIDGY_BLOG_SEARCH_CONFIG`` setting.
+    """
+    id_column = 'id'
+
+    @property
+    def vector(self):
+        config = getattr(settings, 'WIDGY_BLOG_SEARCH_CONFIG', 'english')
+        # This has to match the index exactly.
+        return "to_tsvector('%s'::regconfig, title || ' ' || \"text\")" % config
+
+    @property
+    def tsquery(self):
+        config = getattr(settings, 'WIDGY_BLOG_SEARCH_CONFIG', 'english')
+        return "plainto_tsquery('%s'::regconfig, %%s)" % config
+
+    @property
+    def where(self):
+        return '%s @@ %s' % (self.vector, self.tsquery)
+
+    @property
+    def order_by(self):
+        return 'ts_rank(%s, %s) DESC, date DESC' % (self.vector, self.tsquery)
+
+    def get_query(self, query):
+        return ' '.join(get_words(query))
+
+
+class SQLiteSearchBackend(RawSearchBackend):
+    """
+    Uses the FTS5 table that mirrors the documents.
+    """
+    table = FTS_TABLE
+    id_column = 'rowid'
+    where = '%s MATCH %%s' % FTS_TABLE
+    order_by = 'rank'
+
+    def get_query(self, query):
+        # Quoting every word keeps FTS5's query syntax out of it.
+        return ' '.join('"%s"' % word for word in get_words(query))
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """
+    Finds the documents that contain every word of the query, newest first.
+    It doesn't need anything from the database, but it reads every document.
+    """
+    def get_queryset(self, query):
+        words = get_words(query)
+        if not words:
+            return BlogDocument.objects.none()
+        qs = BlogDocument.objects.all()
+        for word in words:
+            qs = qs.filter(Q(title__icontains=word) | Q(text__icontains=word))
+        return qs.order_by('-date', '-pk')
+
+    def count(self, query):
+        return self.get_queryset(query).count()
+
+    def get_ids(self, query, offset, limit):
+        qs = self.get_queryset(query).values_list('pk', flat=True)
+        return [pk for pk in qs[offset:offset + limit]]
+
+
+def get_default_backend_path():
+    if connection.vendor == 'postgresql':
+        return 'widgy_blog.search.PostgresSearchBackend'
+    # The FTS5 table isn't created if SQLite was built without it.
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        return 'widgy_blog.search.SQLiteSearchBackend'
+    return 'widgy_blog.search.SimpleSearchBackend'
+
+
+_backends = {}
+
+
+def get_search_backend():
+    path = getattr(settings, 'WIDGY_BLOG_SEARCH_BACKEND', None)
+    try:
+        return _backends[path]
+    except KeyError:
+        backend = _backends[path] = fancy_import(path or get_default_backend_path())()
+        return backend
+
+
+def search(query):
+    return get_search_backend().search(query)
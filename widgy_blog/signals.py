@@ -0,0 +1,16 @@
+from django.dispatch import Signal
+
+
+# Sent by PublishedBlog.objects.sync when the published version of a blog
+# changes. `previous` and `current` are PublishedBlog rows, either of which
+# can be None.
+published_blog_changed = Signal(providing_args=['blog', 'previous', 'current'])
+
+# Sent after PublishedBlog.objects.rebuild, when any blog could have changed.
+published_blogs_rebuilt = Signal()
+
+# Sent by widgy_blog.instrumentation when WIDGY_BLOG_INSTRUMENTATION is on.
+# `duration` is in milliseconds, and `queries` counts the queries on the
+# default database.
+phase_timed = Signal(providing_args=['name', 'duration', 'queries'])
+cache_checked = Signal(providing_args=['name', 'hit'])
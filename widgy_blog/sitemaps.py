@@ -1,12 +1,88 @@
-from django.contrib.sitemaps import Sitemap
-from widgy_blog.models import BlogLayout
+from django.conf import settings
+from django.contrib.sitemaps import Sitemap, views as sitemap_views
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse
+
+from widgy_blog.models import BlogLayout, ArchiveMonth, PublishedBlog
+from widgy_blog.cache import get_cache, make_key
+from widgy_blog.utils import month_range
+from widgy_blog.purge import add_surrogate_keys, SITEMAP_KEY
 
 
 class BlogSitemap(Sitemap):
+    """
+    The published blog posts, optionally only the ones from `year`. The items
+    are PublishedBlog rows, so that URLs can be built without fetching the
+    owners, and `lastmod` is when the published commit was published.
+    """
     model = BlogLayout
 
+    def __init__(self, year=None):
+        self.year = year
+
+    @property
+    def limit(self):
+        return getattr(settings, 'WIDGY_BLOG_SITEMAP_LIMIT', Sitemap.limit)
+
     def items(self):
-        return self.model.objects.published()
+        qs = self.model.published_class.objects.select_related('commit').order_by('-date', '-pk')
+        if self.year is not None:
+            start, _ = month_range(self.year, 1)
+            end, _ = month_range(self.year + 1, 1)
+            qs = qs.filter(date__gte=start, date__lt=end)
+        return qs
+
+    def location(self, obj):
+        return reverse(
+            self.model.owner_class.detail_url_name,
+            kwargs={'pk': obj.blog_id, 'slug': obj.slug},
+        )
 
     def lastmod(self, obj):
-        return obj.date
+        return obj.commit.publish_at
+
+    def get_urls(self, page=1, site=None, protocol=None):
+        # Cached until something is published.
+        cache = get_cache()
+        key = make_key('sitemap', self.year or '', page, site and site.domain, protocol)
+        cached = cache.get(key)
+        if cached is None:
+            urls = super(BlogSitemap, self).get_urls(page=page, site=site, protocol=protocol)
+            cached = (urls, getattr(self, 'latest_lastmod', None))
+            cache.set(key, cached)
+
+        urls, latest_lastmod = cached
+        if latest_lastmod is not None:
+            self.latest_lastmod = latest_lastmod
+        return urls
+
+
+def get_year_sitemaps(sitemap_class=BlogSitemap):
+    """
+    A sitemap for each year that has published blog posts, newest first.
+    """
+    years = ArchiveMonth.objects.order_by('-year').values_list('year', flat=True).distinct()
+    return dict((str(year), sitemap_class(year=year)) for year in years)
+
+
+def index(request, sitemap_url_name='blog_sitemap'):
+    """
+    A sitemap index with a section per year, cached until something is
+    published.
+    """
+    PublishedBlog.objects.sync_due()
+    cache = get_cache()
+    key = make_key('sitemap-index', sitemap_url_name, request.scheme, request.get_host())
+    content = cache.get(key)
+    if content is None:
+        response = sitemap_views.index(request, get_year_sitemaps(), sitemap_url_name=sitemap_url_name)
+        content = response.render().content
+        cache.set(key, content)
+    response = HttpResponse(content, content_type='application/xml')
+    return add_surrogate_keys(response, [SITEMAP_KEY])
+
+
+def sitemap(request, section):
+    PublishedBlog.objects.sync_due()
+    response = sitemap_views.sitemap(request, get_year_sitemaps(), section=section)
+    return add_surrogate_keys(response, [SITEMAP_KEY])
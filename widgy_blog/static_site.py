@@ -0,0 +1,289 @@
+"""
+Renders the public blog to a directory of static files, optionally using
+several processes, and incrementally, from the blogs that changed since the
+last export.
+
+Every page belongs to a group (the list, a tag, an archive, a post, the
+feed or the sitemap). A manifest in the output directory records the
+published commit of each post and the files of each group, so that an
+incremental export only renders the groups that the changed posts appear in,
+and deletes the files of groups that no longer exist.
+"""
+import collections
+import json
+import multiprocessing
+import os
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.test import Client
+from django.utils import timezone
+
+from .models import BlogLayout, PublishedBlog, ArchiveMonth, RelatedBlog
+from .utils import chunked, close_db_connections, local_month
+from .views import BlogListView, BlogDetailView
+
+MANIFEST_NAME = '.widgy_blog_manifest.json'
+
+# Links to numbered pages, like the ones in pagination.html, relative to the
+# page or absolute.
+PAGE_LINK_RE = re.compile(r'''href=(["'])(/[^"'?#]*)?\?page=(\d+)\1''')
+
+
+def url_to_path(url):
+    """
+    The file that `url` is written to. Query strings become part of the file
+    name, so ``/blog/?page=2`` is written to ``blog/index.page-2.html``.
+    """
+    path, _, query = url.partition('?')
+    path = path.lstrip('/')
+    if not path or path.endswith('/'):
+        path += 'index.html'
+    if query:
+        base, ext = os.path.splitext(path)
+        path = '%s.%s%s' % (base, query.replace('=', '-').replace('&', '.'), ext)
+    return path
+
+
+def rewrite_page_links(html, url):
+    """
+    Points the links to numbered pages in `html`, the page at `url`, at the
+    files that url_to_path writes them to.
+    """
+    base = url.partition('?')[0]
+
+    def replace(match):
+        quote, path, page = match.groups()
+        target = '/' + url_to_path('%s?page=%s' % (path or base, page))
+        return 'href=%s%s%s' % (quote, target, quote)
+    return PAGE_LINK_RE.sub(replace, html)
+
+
+def get_default_host():
+    for host in settings.ALLOWED_HOSTS:
+        if '*' not in host:
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def render_batch(args):
+    """
+    Renders `urls` into `output_dir`. Returns the number of URLs, and the
+    ones that didn't respond with a 200 with their status codes, or the
+    exceptions they raised as strings (which, unlike some exceptions, can be
+    sent back from other processes).
+    """
+    output_dir, host, urls = args
+    client = Client(HTTP_HOST=host)
+    errors = []
+    for url in urls:
+        try:
+            response = client.get(url)
+        except Exception as e:
+            errors.append((url, '%s: %s' % (type(e).__name__, e)))
+            continue
+        if response.status_code != 200:
+            errors.append((url, response.status_code))
+            continue
+        content = response.content
+        if response['Content-Type'].startswith('text/html'):
+            content = rewrite_page_links(content.decode(response.charset), url).encode(response.charset)
+        path = os.path.join(output_dir, url_to_path(url))
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Readers never see half written files.
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.rename(path + '.tmp', path)
+    return len(urls), errors
+
+
+class StaticSite(object):
+    paginate_by = BlogListView.paginate_by
+
+    def __init__(self, output_dir, host=None):
+        self.output_dir = output_dir
+        self.host = host or get_default_host()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.output_dir, MANIFEST_NAME)
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except IOError:
+            return {'blogs': {}, 'groups': {}}
+
+    def save_manifest(self, manifest):
+        with open(self.manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, sort_keys=True)
+        os.rename(self.manifest_path + '.tmp', self.manifest_path)
+
+    def get_published(self):
+        """
+        Maps the pk of every published blog, as a string like in the
+        manifest, to what its pages depend on.
+        """
+        PublishedBlog.objects.sync_due(timezone.now())
+        rows = PublishedBlog.objects.values_list('blog_id', 'commit_id', 'layout_id', 'slug', 'date')
+        tags = collections.defaultdict(list)
+        through = BlogLayout.tags.through.objects.filter(
+            bloglayout_id__in=PublishedBlog.objects.values('layout'),
+        ).values_list('bloglayout_id', 'tag__slug')
+        for layout_id, slug in through:
+            tags[layout_id].append(slug)
+        # The related posts shown on each page.
+        related = collections.defaultdict(list)
+        for blog_id, related_id in RelatedBlog.objects.order_by('blog_id', '-score').values_list('blog_id', 'related_id'):
+            if len(related[blog_id]) < BlogDetailView.related_blogs_limit:
+                related[blog_id].append(related_id)
+
+        published = {}
+        for blog_id, commit_id, layout_id, slug, date in rows:
+            published[str(blog_id)] = {
+                'commit': commit_id,
+                'slug': slug,
+                'tags': sorted(tags[layout_id]),
+                'month': list(local_month(date)),
+                'related': related[blog_id],
+            }
+        return published
+
+    def paginate(self, url, count):
+        pages = max(1, (count + self.paginate_by - 1) // self.paginate_by)
+        # The first page doesn't have a page number.
+        return [url] + ['%s?page=%d' % (url, page) for page in range(2, pages + 1)]
+
+    def get_groups(self, published):
+        """
+        Maps the name of every group to its URLs.
+        """
+        groups = collections.OrderedDict()
+        groups['list'] = self.paginate(reverse('blog_list'), len(published))
+        groups['feed'] = [reverse('blog_rss_feed')]
+
+        tag_counts = collections.Counter(tag for blog in published.values() for tag in blog['tags'])
+        for tag, count in tag_counts.items():
+            groups['tag:%s' % tag] = self.paginate(reverse('blog_tag', kwargs={'tag': tag}), count) + [
+                reverse('blog_rss_feed', kwargs={'tag': tag}),
+            ]
+
+        years = collections.Counter()
+        for year, month, count in ArchiveMonth.objects.values_list('year', 'month', 'count'):
+            years[year] += count
+            url = reverse('blog_archive_month', kwargs={'year': year, 'month': '%02d' % month})
+            groups['archive:%d:%02d' % (year, month)] = self.paginate(url, count)
+        for year, count in years.items():
+            url = reverse('blog_archive_year', kwargs={'year': year})
+            groups['archive:%d' % year] = self.paginate(url, count)
+
+        if apps.is_installed('django.contrib.sitemaps'):
+            groups['sitemap'] = [reverse('blog_sitemap_index')] + [
+                reverse('blog_sitemap', kwargs={'section': year}) for year in sorted(years)
+            ]
+
+        detail_url_name = PublishedBlog.get_owner_class().detail_url_name
+        for pk, blog in published.items():
+            groups['blog:%s' % pk] = [reverse(detail_url_name, kwargs={'pk': pk, 'slug': blog['slug']})]
+        return groups
+
+    def get_affected_groups(self, previous, current):
+        """
+        The groups whose pages could have changed, given the published blogs
+        of the last export and now.
+        """
+        groups = set()
+        changed = set()
+        for pk in set(previous) | set(current):
+            before, after = previous.get(pk), current.get(pk)
+            if before == after:
+                continue
+            groups.add('blog:%s' % pk)
+            if before is not None and after is not None and dict(before, related=None) == dict(after, related=None):
+                # Only its related posts changed, which only its page shows.
+                continue
+            changed.add(pk)
+            for blog in (before, after):
+                if blog is None:
+                    continue
+                year, month = blog['month']
+                groups.add('archive:%d' % year)
+                groups.add('archive:%d:%02d' % (year, month))
+                groups.update('tag:%s' % tag for tag in blog['tags'])
+        if not changed:
+            return groups
+
+        groups.update(['list', 'feed', 'sitemap'])
+        # The pages that show the changed blogs as related posts.
+        for blogs in (previous, current):
+            for pk, blog in blogs.items():
+                if changed.intersection(str(related_id) for related_id in blog.get('related', ())):
+                    groups.add('blog:%s' % pk)
+        return groups
+
+    def render(self, urls, workers=1, batch_size=50):
+        """
+        Renders `urls`, yielding the number of URLs rendered and the errors
+        as each batch finishes.
+        """
+        batches = ((self.output_dir, self.host, batch) for batch in chunked(urls, batch_size))
+        if workers <= 1:
+            for batch in batches:
+                yield render_batch(batch)
+            return
+
+        close_db_connections()
+        pool = multiprocessing.Pool(workers, initializer=close_db_connections)
+        try:
+            for result in pool.imap_unordered(render_batch, batches):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+    def delete_files(self, urls):
+        for url in urls:
+            path = os.path.join(self.output_dir, url_to_path(url))
+            if os.path.exists(path):
+                os.remove(path)
+
+    def export(self, workers=1, incremental=False):
+        """
+        Renders the groups that changed, or all of them, and records them in
+        the manifest. Yields progress like render. The manifest isn't updated
+        if any page fails, so the next incremental export tries again.
+        """
+        manifest = self.load_manifest() if incremental else {'blogs': {}, 'groups': {}}
+        published = self.get_published()
+        groups = self.get_groups(published)
+
+        if incremental:
+            affected = self.get_affected_groups(manifest['blogs'], published)
+            to_render = [name for name in groups if name in affected or name not in manifest['groups']]
+        else:
+            to_render = [name for name in groups]
+
+        # Files of groups that disappeared, or that have fewer pages now.
+        stale = []
+        for name, urls in manifest['groups'].items():
+            stale.extend(set(urls) - set(groups.get(name, ())))
+        self.delete_files(stale)
+
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        urls = [url for name in to_render for url in groups[name]]
+        failed = False
+        for count, errors in self.render(urls, workers):
+            failed = failed or bool(errors)
+            yield count, errors
+        if failed:
+            return
+
+        manifest['blogs'] = published
+        manifest['groups'] = groups
+        self.save_manifest(manifest)
@@ -0,0 +1,45 @@
+import django
+from django import template
+from django.core.urlresolvers import reverse
+
+from widgy_blog.models import RelatedBlog
+
+register = template.Library()
+
+# simple_tag supports `as` since Django 1.9.
+if django.VERSION < (1, 9):
+    assignment_tag = register.assignment_tag
+else:
+    assignment_tag = register.simple_tag
+
+
+@register.simple_tag(takes_context=True)
+def render_blog(context, blog):
+    """
+    Renders the content of a BlogRenderer, using the render cache when
+    possible.
+    """
+    return blog.render(context)
+
+
+@assignment_tag
+def related_blogs(blog, limit=5):
+    """
+    The published blogs most related to a Blog or BlogRenderer::
+
+        {% related_blogs blog 5 as related %}
+    """
+    return RelatedBlog.objects.for_blog(getattr(blog, 'blog', blog).pk, limit)
+
+
+@register.inclusion_tag('widgy/widgy_blog/search_result.html')
+def blog_search_result(result):
+    """
+    Renders a haystack result for a blog from the fields stored in the index,
+    without any queries.
+    """
+    tags = zip(result.tags or (), result.tag_slugs or ())
+    return {
+        'result': result,
+        'tags': [{'name': name, 'url': reverse('blog_tag', kwargs={'tag': slug})} for name, slug in tags],
+    }
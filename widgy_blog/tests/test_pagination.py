@@ -0,0 +1,53 @@
+import datetime
+
+from django.core.paginator import InvalidPage
+from django.test import TestCase
+from django.utils import timezone
+
+from widgy_blog.models import BlogLayout
+from widgy_blog.pagination import KeysetPaginator, decode_cursor, encode_cursor
+
+from .utils import make_blog
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        # Two of them on the same date, so the pk breaks the tie.
+        for i, days in enumerate([0, 1, 1, 2, 3]):
+            make_blog(title='Post %d' % i, date=now - datetime.timedelta(days=days))
+        self.paginator = KeysetPaginator(BlogLayout.objects.published(), 2)
+        self.expected = [layout.title for layout in BlogLayout.objects.published().order_by('-date', '-pk')]
+
+    def titles(self, page):
+        return [layout.title for layout in page]
+
+    def test_pages_forward(self):
+        first = self.paginator.page()
+        self.assertEqual(self.titles(first), self.expected[:2])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+        second = self.paginator.page(after=first.next_cursor)
+        self.assertEqual(self.titles(second), self.expected[2:4])
+        self.assertTrue(second.has_previous())
+
+        last = self.paginator.page(after=second.next_cursor)
+        self.assertEqual(self.titles(last), self.expected[4:])
+        self.assertFalse(last.has_next())
+        self.assertIsNone(last.next_cursor)
+
+    def test_pages_backward(self):
+        second = self.paginator.page(after=self.paginator.page().next_cursor)
+        first = self.paginator.page(before=second.previous_cursor)
+        self.assertEqual(self.titles(first), self.expected[:2])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+    def test_cursor_round_trip(self):
+        layout = BlogLayout.objects.published().first()
+        self.assertEqual(decode_cursor(encode_cursor(layout)), (layout.date, layout.pk))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidPage):
+            self.paginator.page(after='not a cursor')
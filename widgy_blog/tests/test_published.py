@@ -0,0 +1,73 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from widgy.models import VersionCommit
+
+from widgy_blog.models import BlogLayout, BlogSchedule, PublishedBlog, ScheduledSync
+
+from .utils import make_blog
+
+
+class PublishedBlogSyncTest(TestCase):
+    def test_commit_publishes(self):
+        blog = make_blog()
+        published = PublishedBlog.objects.get(blog=blog)
+        self.assertEqual(published.commit, blog.content.head)
+        self.assertEqual(published.layout, blog.content.head.root_node.content)
+        self.assertEqual(list(BlogLayout.objects.published()), [published.layout])
+
+    def test_working_copy_isnt_published(self):
+        make_blog(commit=False)
+        self.assertFalse(PublishedBlog.objects.exists())
+        self.assertFalse(BlogLayout.objects.published().exists())
+
+    def test_new_commit_replaces_row(self):
+        blog = make_blog()
+        commit = blog.content.commit()
+        self.assertEqual(PublishedBlog.objects.get(blog=blog).commit, commit)
+
+    def test_scheduled_commit_is_published_when_due(self):
+        later = timezone.now() + datetime.timedelta(hours=1)
+        blog = make_blog(publish_at=later)
+        self.assertFalse(PublishedBlog.objects.exists())
+        self.assertEqual(list(ScheduledSync.objects.values_list('blog', 'due_at')), [(blog.pk, later)])
+        self.assertEqual(PublishedBlog.objects.sync_due(timezone.now()), [])
+
+        # The time comes.
+        earlier = timezone.now() - datetime.timedelta(minutes=1)
+        VersionCommit.objects.update(publish_at=earlier)
+        ScheduledSync.objects.update(due_at=earlier)
+        self.assertEqual(PublishedBlog.objects.sync_due(timezone.now()), [blog])
+        self.assertEqual(PublishedBlog.objects.get(blog=blog).commit, blog.content.head)
+        self.assertFalse(ScheduledSync.objects.exists())
+
+    def test_schedule_hides_blog(self):
+        blog = make_blog()
+        BlogSchedule.objects.create(blog=blog, publish_at=timezone.now() + datetime.timedelta(hours=1))
+        self.assertFalse(PublishedBlog.objects.exists())
+
+
+class ReconcileTest(TestCase):
+    def test_restores_missing_rows(self):
+        blog = make_blog()
+        PublishedBlog.objects.all().delete()
+        self.assertEqual(PublishedBlog.objects.reconcile(), [blog])
+        self.assertEqual(PublishedBlog.objects.get(blog=blog).commit, blog.content.head)
+
+    def test_nothing_to_do(self):
+        make_blog()
+        make_blog(commit=False)
+        self.assertEqual(PublishedBlog.objects.reconcile(), [])
+
+    def test_expires_blogs(self):
+        blog = make_blog()
+        BlogSchedule.objects.create(blog=blog, expire_at=timezone.now() + datetime.timedelta(hours=1))
+        self.assertTrue(PublishedBlog.objects.exists())
+
+        # The time comes, without any signals.
+        BlogSchedule.objects.update(expire_at=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertEqual(PublishedBlog.objects.reconcile(), [blog])
+        self.assertFalse(PublishedBlog.objects.exists())
+        self.assertEqual(PublishedBlog.objects.reconcile(), [])
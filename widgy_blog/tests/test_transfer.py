@@ -0,0 +1,48 @@
+import json
+
+from django.test import TestCase
+
+from widgy.contrib.page_builder.models import Html
+
+from widgy_blog.models import Blog, PublishedBlog, Tag, defer_published_sync
+from widgy_blog.site import site
+from widgy_blog.transfer import Importer, dump_blog
+
+from .utils import make_blog
+
+
+def without_pk(line):
+    data = json.loads(line)
+    del data['pk']
+    return data
+
+
+class TransferTest(TestCase):
+    def make_blog(self):
+        blog = make_blog(title='Exported', tags=[Tag.objects.create(name='Django')], commit=False)
+        main = blog.content.working_copy.content.get_children()[0]
+        main.add_child(site, Html, content='<p>Hello</p>')
+        blog.content.commit()
+        return Blog.objects.get(pk=blog.pk)
+
+    def test_round_trip(self):
+        line = dump_blog(self.make_blog())
+        imported = Importer().load_blog(line)
+        self.assertNotEqual(imported.pk, json.loads(line)['pk'])
+        self.assertEqual(without_pk(dump_blog(Blog.objects.get(pk=imported.pk))), without_pk(line))
+        self.assertEqual(PublishedBlog.objects.get(blog=imported).layout.tags.get().name, 'Django')
+
+    def test_working_copy(self):
+        blog = make_blog(title='Draft', commit=False)
+        data = json.loads(dump_blog(blog))
+        self.assertFalse(data['published'])
+        imported = Importer().import_blog(data)
+        self.assertFalse(PublishedBlog.objects.filter(blog=imported).exists())
+        self.assertEqual(imported.working_title, 'Draft')
+
+    def test_deferred_import(self):
+        line = dump_blog(self.make_blog())
+        with defer_published_sync():
+            imported = Importer().load_blog(line)
+            self.assertFalse(PublishedBlog.objects.filter(blog=imported).exists())
+        self.assertTrue(PublishedBlog.objects.filter(blog=imported).exists())
@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from widgy_blog.models import Blog, BlogLayout
+from widgy_blog.site import site
+
+
+def make_blog(title='Post', date=None, tags=(), commit=True, publish_at=None):
+    """
+    Creates a blog with a working copy, and commits it unless `commit` is
+    False.
+    """
+    author = get_user_model().objects.get_or_create(username='author')[0]
+    layout = BlogLayout.add_root(site, title=title, author=author, date=date or timezone.now())
+    layout.tags.add(*tags)
+    tracker = site.get_version_tracker_model().objects.create(working_copy=layout.node)
+    blog = Blog.objects.create(content=tracker)
+    if commit:
+        kwargs = {'publish_at': publish_at} if publish_at is not None else {}
+        tracker.commit(user=author, **kwargs)
+    return blog
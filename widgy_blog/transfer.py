@@ -0,0 +1,157 @@
+"""
+Converts blog posts to and from JSON Lines, one post per line, for moving
+content between sites.
+
+Each line has the fields of the post's layout and of every widget below it
+in ``tree``, with the layout's author as a username and its tags as names.
+Other foreign keys are kept as primary keys, so the objects they point to
+(like images) have to exist on the importing site.
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+
+from widgy.models import Node
+
+from .models import PublishedBlog, Tag
+from .site import site
+
+# These are exported separately, by natural key.
+LAYOUT_EXCLUDE = ('author', 'tags')
+
+
+def serialize_content(content):
+    data = serializers.serialize('python', [content])[0]
+    return {'model': data['model'], 'fields': data['fields']}
+
+
+def serialize_node(node):
+    data = serialize_content(node.content)
+    data['children'] = [serialize_node(child) for child in node.get_children()]
+    return data
+
+
+def export_blog(blog):
+    """
+    The published version of `blog`, or its working copy if it isn't
+    published, as a dictionary.
+    """
+    try:
+        root_node = blog.published_blog.commit.root_node
+        published = True
+    except ObjectDoesNotExist:
+        root_node = blog.content.working_copy
+        published = False
+    root_node.prefetch_tree()
+    layout = root_node.content
+
+    tree = serialize_node(root_node)
+    for field_name in LAYOUT_EXCLUDE:
+        tree['fields'].pop(field_name, None)
+    return {
+        'pk': blog.pk,
+        'published': published,
+        'author': layout.author.get_username(),
+        'tags': [tag.name for tag in layout.tags.all()],
+        'tree': tree,
+    }
+
+
+def iter_blogs(batch_size=500):
+    """
+    Every blog, fetched `batch_size` at a time so that they don't all have to
+    be in memory.
+    """
+    queryset = PublishedBlog.get_owner_class().objects.select_related(
+        'content__working_copy', 'published_blog__commit__root_node',
+    ).order_by('pk')
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        count = 0
+        for blog in batch[:batch_size].iterator():
+            count += 1
+            last_pk = blog.pk
+            yield blog
+        if count < batch_size:
+            return
+
+
+def dump_blog(blog):
+    return json.dumps(export_blog(blog), cls=DjangoJSONEncoder, sort_keys=True)
+
+
+def create_content(data):
+    obj = next(serializers.deserialize('python', [{'model': data['model'], 'fields': data['fields']}]))
+    obj.save()
+    return obj.object
+
+
+def import_tree(data):
+    """
+    Creates the widgets of a serialized tree, and their nodes with a single
+    query like Node.clone_tree does.
+    """
+    root = Node.add_root(content=create_content(data), numchild=len(data['children']))
+    nodes = []
+
+    def add_children(parent_path, depth, children):
+        for i, child in enumerate(children, 1):
+            path = Node._get_path(parent_path, depth, i)
+            nodes.append(Node(
+                content=create_content(child),
+                path=path,
+                depth=depth,
+                numchild=len(child['children']),
+            ))
+            add_children(path, depth + 1, child['children'])
+
+    add_children(root.path, 2, data['children'])
+    Node.objects.bulk_create(nodes)
+    return root
+
+
+class Importer(object):
+    """
+    Creates blogs from the dictionaries made by export_blog. Authors have to
+    exist already, and tags are created as needed.
+    """
+    def __init__(self):
+        self.users = {}
+        self.tags = {}
+
+    def get_user(self, username):
+        try:
+            return self.users[username]
+        except KeyError:
+            user = self.users[username] = get_user_model().objects.get_by_natural_key(username)
+            return user
+
+    def get_tag(self, name):
+        try:
+            return self.tags[name]
+        except KeyError:
+            tag = self.tags[name] = Tag.objects.get_or_create(name=name)[0]
+            return tag
+
+    def import_blog(self, data):
+        author = self.get_user(data['author'])
+        tree = data['tree']
+        tree['fields']['author'] = author.pk
+        tree['fields']['tags'] = [self.get_tag(name).pk for name in data['tags']]
+
+        root = import_tree(tree)
+        tracker = site.get_version_tracker_model().objects.create(working_copy=root)
+        blog = PublishedBlog.get_owner_class()(content=tracker)
+        # The layout was saved before the blog existed.
+        blog.set_layout_fields('working_', root.content)
+        blog.save()
+        if data['published']:
+            tracker.commit(user=author)
+        return blog
+
+    def load_blog(self, line):
+        return self.import_blog(json.loads(line))
@@ -1,7 +1,10 @@
 import itertools
 import datetime
 
+from django.conf import settings
+from django.db import connections
 from django.core import urlresolvers
+from django.utils import timezone
 
 
 class Year(list):
@@ -21,13 +24,16 @@ class Year(list):
 
 
 class Month(list):
-    def __init__(self, year, month, days):
+    def __init__(self, year, month, days, count=None):
         days = itertools.groupby(days, lambda d: d.day)
         super(Month, self).__init__(Day(year, month, *args) for args in days)
         self.date = datetime.date(year, month, 1)
+        self._count = count
 
     @property
     def count(self):
+        if self._count is not None:
+            return self._count
         return sum(day.count for day in self)
 
     def get_absolute_url(self):
@@ -47,3 +53,71 @@ class Day(datetime.date):
 def date_list_to_archive_list(values):
     years = itertools.groupby(values, lambda d: d.year)
     return [Year(*args) for args in years]
+
+
+def month_counts_to_archive_list(values):
+    """
+    Like date_list_to_archive_list, but takes (year, month, count) tuples,
+    newest first. The months don't contain any days.
+    """
+    archive = []
+    for year, months in itertools.groupby(values, lambda v: v[0]):
+        year_obj = Year(year, [])
+        year_obj.extend(Month(year, month, [], count) for _, month, count in months)
+        archive.append(year_obj)
+    return archive
+
+
+def local_month(value):
+    """
+    The (year, month) that the archive views will find `value` in.
+    """
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.year, value.month
+
+
+def month_range(year, month):
+    """
+    The datetimes at the start of the month and the start of the next one.
+    """
+    start = datetime.datetime(year, month, 1)
+    if month == 12:
+        end = datetime.datetime(year + 1, 1, 1)
+    else:
+        end = datetime.datetime(year, month + 1, 1)
+    if settings.USE_TZ:
+        start, end = timezone.make_aware(start), timezone.make_aware(end)
+    return start, end
+
+
+def chunked(iterable, size):
+    """
+    Splits `iterable` into lists of at most `size` items.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def close_db_connections():
+    # Connections can't be shared between processes or threads, so each one
+    # has to open its own.
+    for connection in connections.all():
+        connection.close()
+
+
+def related_score(tags, date, other_tags, other_date, half_life):
+    """
+    The Jaccard similarity of two sets of tags, halved for every `half_life`
+    days between the two dates.
+    """
+    shared = len(tags & other_tags)
+    if not shared:
+        return 0.0
+    similarity = float(shared) / len(tags | other_tags)
+    days = abs((date - other_date).total_seconds()) / 86400
+    return similarity * 0.5 ** (days / half_life)
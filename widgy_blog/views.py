@@ -1,20 +1,43 @@
 import datetime
+import hashlib
 
+from django.db.models import Max
 from django.utils import six
+from django.utils.encoding import force_bytes
 from django.utils.six.moves.urllib import parse
-from django.views.generic import ListView, DetailView
+from django.conf import settings
+from django.views.generic import View, ListView, DetailView
 from django.shortcuts import redirect, get_object_or_404
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import condition
+from django.core.paginator import InvalidPage
 from django.contrib.syndication.views import Feed
 from django.core import urlresolvers
 
-from widgy.utils import build_url
+from widgy.utils import build_url, update_context
 from widgy.templatetags.widgy_tags import render_root
 from widgy.models import Node
 from widgy.contrib.form_builder.views import HandleFormMixin
 
-from .models import Blog, BlogLayout, Tag
+from .models import Blog, BlogLayout, BlogSlug, Tag, ArchiveMonth, RelatedBlog, PublishedBlog
 from .site import site
-from .utils import date_list_to_archive_list
+from .utils import month_counts_to_archive_list
+from .cache import get_cache, make_key, render_cache, local_cache
+from .pagination import KeysetPaginator
+from .search import search
+from .instrumentation import (InstrumentedViewMixin, Timings, measure,
+                              record_cache, add_server_timing)
+from .purge import (SurrogateKeyMixin, add_surrogate_keys, blog_key, tag_key,
+                    archive_key, LIST_KEY, FEED_KEY)
+
+
+def get_eager_load(view):
+    """
+    Whether `view` loads the author, image and tags of the blogs it lists.
+    """
+    if view.eager_load is None:
+        return getattr(settings, 'WIDGY_BLOG_EAGER_LOAD', False)
+    return view.eager_load
 
 
 class RedirectGetHandleFormMixin(HandleFormMixin):
@@ -31,12 +54,19 @@ class RedirectGetHandleFormMixin(HandleFormMixin):
 
 
 class BlogRenderer(object):
-    def __init__(self, blog, url_kwargs, request):
+    def __init__(self, blog, url_kwargs, request, root_node=None):
         self.blog = blog
         self.url_kwargs = url_kwargs
         root_node_pk = url_kwargs.get('root_node_pk')
+        # Previews and forms with errors must not be served from the cache.
+        self.use_render_cache = not root_node_pk
         if root_node_pk:
             self.root_node = get_object_or_404(Node, pk=root_node_pk)
+            # Previews are always rendered, and the layout comes with the
+            # rest of the tree.
+            self.root_node.prefetch_tree()
+        elif root_node is not None:
+            self.root_node = root_node
         else:
             self.root_node = blog._meta.get_field('content').get_render_node(blog, {'request': request})
             if not self.root_node:
@@ -58,8 +88,31 @@ class BlogRenderer(object):
     def date(self):
         return self.blog.date
 
-    def render(self):
-        return render_root({'root_node_override': self.root_node}, self.blog, 'content')
+    def get_template_set(self):
+        """
+        Identifies the templates that the tree is rendered with, for sites
+        that render the same blog differently depending on the request.
+        """
+        return getattr(settings, 'WIDGY_BLOG_TEMPLATE_SET', '')
+
+    def render(self, context=None):
+        def render():
+            # The whole tree is fetched with a query for the nodes and one per
+            # content type, instead of level by level while rendering. Cached
+            # renders don't need it.
+            with measure('prefetch'):
+                self.root_node.maybe_prefetch_tree()
+            with update_context(context, {'root_node_override': self.root_node}) as ctx:
+                with measure('render_root'):
+                    return render_root(ctx, self.blog, 'content')
+
+        # Working copies are rendered when there is nothing published, and
+        # they can change at any time.
+        with measure('render'):
+            if self.use_render_cache and self.root_node.is_frozen:
+                return render_cache.get_or_render(self.root_node, self.get_template_set(), render)
+            else:
+                return render()
 
     @property
     def has_incorrect_slug(self):
@@ -70,21 +123,55 @@ class BlogRenderer(object):
             return False
 
 
-class BlogQuerysetMixin(object):
+class BlogQuerysetMixin(InstrumentedViewMixin, SurrogateKeyMixin):
     model = BlogLayout
+    # Whether to load the related objects that the templates display.
+    # Defaults to the WIDGY_BLOG_EAGER_LOAD setting.
+    eager_load = None
+
+    def dispatch(self, request, *args, **kwargs):
+        self.sync_due()
+        return super(BlogQuerysetMixin, self).dispatch(request, *args, **kwargs)
+
+    def sync_due(self):
+        """
+        Publishes and expires the blogs that came due, so that every page
+        sees the same published blogs.
+        """
+        if self.model.has_published_table():
+            self.model.published_class.objects.sync_due()
 
     def get_queryset(self):
         return self.get_published_blogs()
 
     def get_published_blogs(self):
-        return self.model.objects.select_related('image').published().order_by('-date')
+        qs = self.model.objects.select_related('image').published().with_owners()
+        if get_eager_load(self):
+            qs = qs.eager()
+        return qs.order_by('-date')
 
-    def get_archive_years(self, qs):
-        return date_list_to_archive_list(qs.values_list('date', flat=True).order_by('-date'))
+    def get_blog_archive(self):
+        """
+        The archive of all published blogs, built from the precomputed
+        monthly counts and cached until the published blogs change.
+        """
+        with measure('archive'):
+            cache = get_cache()
+            key = make_key('archive')
+            months = cache.get(key)
+            record_cache('archive', months is not None)
+            if months is None:
+                months = tuple(ArchiveMonth.objects.values_list('year', 'month', 'count'))
+                cache.set(key, months)
+            return month_counts_to_archive_list(months)
+
+    def get_surrogate_keys(self):
+        # Every page has the archive sidebar.
+        return [LIST_KEY]
 
     def get_context_data(self, **kwargs):
         data = super(BlogQuerysetMixin, self).get_context_data(**kwargs)
-        data['blog_archive'] = self.get_archive_years(self.get_published_blogs())
+        data['blog_archive'] = self.get_blog_archive()
         return data
 
 
@@ -92,25 +179,56 @@ class BlogListView(BlogQuerysetMixin, ListView):
     context_object_name = 'blog_list'
     template_name = 'widgy/widgy_blog/blog_list.html'
     paginate_by = 10
+    # 'offset' or 'keyset', defaults to the WIDGY_BLOG_PAGINATION setting.
+    pagination_mode = None
+    cursor_kwargs = ('after', 'before')
+
+    def get_pagination_mode(self):
+        return self.pagination_mode or getattr(settings, 'WIDGY_BLOG_PAGINATION', 'offset')
+
+    def uses_keyset_pagination(self):
+        # Page numbers still work in keyset mode, for old URLs.
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg)
+        return self.get_pagination_mode() == 'keyset' and not page
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.uses_keyset_pagination():
+            return super(BlogListView, self).paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(
+                after=self.request.GET.get('after'),
+                before=self.request.GET.get('before'),
+            )
+        except InvalidPage as e:
+            raise Http404(six.text_type(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
 
-    def get_canonical_url(self):
+    def get_canonical_url(self, page=None):
         """Determine whether to send a canonical url for the blog list.
 
         A blog list view without any query should be the same as a blog
         list view with query `page=1`. The `page=1` view should have a canonical
-        link to the simpler URL.
+        link to the simpler URL. The same goes for a keyset page that has no
+        previous page.
         """
-        if self.request.GET.get('page') == '1':
-            querystring = self.request.GET.copy()
+        querystring = self.request.GET.copy()
+        if querystring.get('page') == '1':
             del querystring['page']
-            return parse.urlunsplit(('', '', self.request.path, querystring.urlencode(), ''))
+        elif (getattr(page, 'is_keyset', False) and not page.has_previous()
+              and any(i in querystring for i in self.cursor_kwargs)):
+            for i in self.cursor_kwargs:
+                querystring.pop(i, None)
         else:
             return None
+        return parse.urlunsplit(('', '', self.request.path, querystring.urlencode(), ''))
 
-    def get_neighbor_pages(self):
+    def get_neighbor_pages(self, page=None):
         querystring = self.request.GET.copy()
-        paginator = self.get_paginator(self.get_queryset(), self.paginate_by)
-        page = self.get_current_page(paginator)
+        if page is None:
+            paginator = self.get_paginator(self.get_queryset(), self.paginate_by)
+            page = self.get_current_page(paginator)
 
         prev_page = None
         next_page = None
@@ -123,8 +241,29 @@ class BlogListView(BlogQuerysetMixin, ListView):
 
         return {'prev': prev_page, 'next': next_page}
 
-    def get_neighbor_rel_links(self):
-        neighbor_pages = self.get_neighbor_pages()
+    def get_keyset_rel_links(self, page):
+        querystring = self.request.GET.copy()
+        for i in self.cursor_kwargs:
+            querystring.pop(i, None)
+        prev_link = None
+        next_link = None
+
+        if page.has_previous():
+            prev_querystring = querystring.copy()
+            prev_querystring['before'] = page.previous_cursor
+            prev_link = build_url(self.request.path, prev_querystring)
+        if page.has_next():
+            next_querystring = querystring.copy()
+            next_querystring['after'] = page.next_cursor
+            next_link = build_url(self.request.path, next_querystring)
+
+        return {'prev_link': prev_link, 'next_link': next_link}
+
+    def get_neighbor_rel_links(self, page=None):
+        if getattr(page, 'is_keyset', False):
+            return self.get_keyset_rel_links(page)
+
+        neighbor_pages = self.get_neighbor_pages(page)
         querystring = self.request.GET.copy()
         prev_link = None
         next_link = None
@@ -159,11 +298,28 @@ class BlogListView(BlogQuerysetMixin, ListView):
 
         return paginator.page(page_num)
 
+    def get_tag_cloud(self):
+        """
+        The tags of published blogs with their `published_count`, cached
+        until tags or published blogs change.
+        """
+        limit = getattr(settings, 'WIDGY_BLOG_TAG_CLOUD_LIMIT', None)
+        with measure('tags'):
+            cache = get_cache()
+            key = make_key('tags', limit)
+            tags = cache.get(key)
+            record_cache('tags', tags is not None)
+            if tags is None:
+                tags = [tag for tag in Tag.objects.cloud(limit)]
+                cache.set(key, tags)
+            return tags
+
     def get_context_data(self, **kwargs):
         kwargs = super(BlogListView, self).get_context_data(**kwargs)
-        kwargs['tags'] = Tag.objects.all()
-        kwargs['canonical_url'] = self.get_canonical_url()
-        kwargs.update(self.get_neighbor_rel_links())
+        kwargs['tags'] = self.get_tag_cloud()
+        page = kwargs.get('page_obj')
+        kwargs['canonical_url'] = self.get_canonical_url(page)
+        kwargs.update(self.get_neighbor_rel_links(page))
 
         return kwargs
 
@@ -173,6 +329,9 @@ class TagView(BlogListView):
         self.tag = get_object_or_404(Tag, slug=self.kwargs['tag'])
         return super(TagView, self).get_queryset().filter(tags=self.tag)
 
+    def get_surrogate_keys(self):
+        return super(TagView, self).get_surrogate_keys() + [tag_key(self.kwargs['tag'])]
+
     def get_context_data(self, **kwargs):
         kwargs = super(TagView, self).get_context_data(**kwargs)
         kwargs['current_tag'] = self.tag
@@ -184,6 +343,10 @@ class BlogYearArchiveView(BlogListView):
         qs = super(BlogYearArchiveView, self).get_queryset()
         return qs.filter(date__year=self.kwargs['year'])
 
+    def get_surrogate_keys(self):
+        keys = super(BlogYearArchiveView, self).get_surrogate_keys()
+        return keys + [archive_key(self.kwargs['year'])]
+
     def get_context_data(self, **kwargs):
         kwargs = super(BlogYearArchiveView, self).get_context_data(**kwargs)
         year = int(self.kwargs['year'])
@@ -199,6 +362,10 @@ class BlogMonthArchiveView(BlogListView):
             date__month=self.kwargs['month']
         )
 
+    def get_surrogate_keys(self):
+        keys = super(BlogMonthArchiveView, self).get_surrogate_keys()
+        return keys + [archive_key(self.kwargs['year'], self.kwargs['month'])]
+
     def get_context_data(self, **kwargs):
         kwargs = super(BlogMonthArchiveView, self).get_context_data(**kwargs)
         year = int(self.kwargs['year'])
@@ -207,11 +374,41 @@ class BlogMonthArchiveView(BlogListView):
         return kwargs
 
 
+class BlogSearchView(BlogQuerysetMixin, ListView):
+    """
+    Searches the published blogs with the built in search, best matches
+    first.
+    """
+    context_object_name = 'results'
+    template_name = 'widgy/widgy_blog/search.html'
+    paginate_by = 10
+
+    def dispatch(self, request, *args, **kwargs):
+        # Without WIDGY_BLOG_SEARCH nothing is indexed, so every search
+        # would come back empty.
+        if not getattr(settings, 'WIDGY_BLOG_SEARCH', False):
+            raise Http404('Search is disabled.')
+        return super(BlogSearchView, self).dispatch(request, *args, **kwargs)
+
+    def get_search_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_queryset(self):
+        return search(self.get_search_query())
+
+    def get_context_data(self, **kwargs):
+        kwargs = super(BlogSearchView, self).get_context_data(**kwargs)
+        kwargs['query'] = self.get_search_query()
+        return kwargs
+
+
 class BlogDetailView(BlogQuerysetMixin, RedirectGetHandleFormMixin, DetailView):
     context_object_name = 'blog'
     template_name = 'widgy/widgy_blog/blog_detail.html'
     site = site
     owner_class = Blog
+    # The number of blogs in the related_blogs context variable.
+    related_blogs_limit = 5
 
     def get_object(self):
         try:
@@ -222,48 +419,186 @@ class BlogDetailView(BlogQuerysetMixin, RedirectGetHandleFormMixin, DetailView):
 
         self.root_node_pk = self.kwargs.get('root_node_pk')
 
+        if not self.root_node_pk:
+            published = self.get_published_blog(self.kwargs['pk'])
+            return BlogRenderer(published.blog, self.kwargs, self.request,
+                                root_node=published.commit.root_node)
+
+        self.site.authorize_view(self.request, self)
         qs = self.owner_class.objects.filter(
             pk=self.kwargs['pk']
         ).select_related(
             'content__head__root_node',
         )
-        if self.root_node_pk:
-            self.site.authorize_view(self.request, self)
-        else:
-            qs = qs.filter(
-                content__commits__root_node__content_id__in=self.get_queryset()
-            )
         blog = get_object_or_404(qs)
 
         return BlogRenderer(blog, self.kwargs, self.request)
 
-    def dispatch(self, request, *args, **kwargs):
+    def get_published_blog(self, pk):
+        """
+        Fetches the blog, its published root node and layout in one query.
+        The result can be cached in the process for WIDGY_BLOG_DETAIL_CACHE_TTL
+        seconds.
+        """
+        key = ('detail', self.model.published_class, pk)
+        with measure('published_blog'):
+            published = local_cache.get(key)
+            record_cache('detail', published is not None)
+            if published is None:
+                published = get_object_or_404(
+                    self.model.published_class.objects.select_related(
+                        'blog__content', 'commit__root_node', 'layout',
+                    ),
+                    blog_id=pk,
+                )
+                published.commit.root_node.content = published.layout
+                local_cache.set(key, published, getattr(settings, 'WIDGY_BLOG_DETAIL_CACHE_TTL', 0))
+            return published
+
+    def get_surrogate_keys(self):
+        keys = super(BlogDetailView, self).get_surrogate_keys()
+        return keys + [blog_key(self.kwargs['pk'])]
+
+    def get_form_node(self):
+        """
+        Fetches the whole tree that the form is in, so that a form with
+        errors can be rendered again without fetching it a second time.
+        """
+        form_node = get_object_or_404(Node, pk=self.kwargs['form_node_pk'])
+        self.form_root_node = form_node.get_root()
+        self.form_root_node.prefetch_tree()
+        for node in self.form_root_node.depth_first_order():
+            if node.pk == form_node.pk:
+                return node
+        return form_node
+
+    def get(self, request, *args, **kwargs):
+        return self.redirect_incorrect_slug() or super(BlogDetailView, self).get(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        return self.redirect_incorrect_slug() or super(BlogDetailView, self).post(request, *args, **kwargs)
+
+    def redirect_incorrect_slug(self):
+        """
+        Redirects to the blog's URL if the slug is wrong. Called by the
+        handlers, so that the redirect is timed and gets the surrogate keys.
+        """
         self.object = blog = self.get_object()
         if blog.has_incorrect_slug:
-            return redirect(blog)
-        return super(BlogDetailView, self).dispatch(request, *args, **kwargs)
+            # The pk identifies the blog, so the slug can never be right.
+            return redirect(blog, permanent=True)
+        return None
 
     def get_context_data(self, **kwargs):
         kwargs = super(BlogDetailView, self).get_context_data(**kwargs)
         kwargs['object'] = self.object
         if hasattr(self, 'form_node'):
-            self.object.root_node = self.form_node.get_root()
+            self.object.root_node = self.form_root_node
+            self.object.use_render_cache = False
         # BlogRenderer calculates and fetches this
         kwargs['root_node_override'] = self.object.root_node
+        # Only queried if the template uses it.
+        kwargs['related_blogs'] = RelatedBlog.objects.for_blog(self.object.blog.pk, self.related_blogs_limit)
         return kwargs
 
 
+class BlogSlugRedirectView(SurrogateKeyMixin, View):
+    """
+    Redirects URLs with any slug a blog has been published with, but no pk,
+    to the blog's current URL, with a single query.
+    """
+    owner_class = Blog
+
+    def get(self, request, slug, **kwargs):
+        PublishedBlog.objects.sync_due()
+        found = BlogSlug.objects.find(slug)
+        if found is None:
+            raise Http404('No blog has been published with this slug.')
+        pk, current_slug = found
+        url = urlresolvers.reverse(self.owner_class.detail_url_name, kwargs={'pk': pk, 'slug': current_slug})
+        return redirect(url, permanent=True)
+
+    def get_surrogate_keys(self):
+        # The current slug changes when blogs are published.
+        return [LIST_KEY]
+
+
 list = BlogListView.as_view()
 year_archive = BlogYearArchiveView.as_view()
 month_archive = BlogMonthArchiveView.as_view()
 detail = BlogDetailView.as_view()
 tag = TagView.as_view()
+blog_search = BlogSearchView.as_view()
+slug_redirect = BlogSlugRedirectView.as_view()
 
 
 class RssFeed(Feed):
     title = "Blog Feed"
     link = urlresolvers.reverse_lazy('blog_list')
     model = BlogLayout
+    # Defaults to the WIDGY_BLOG_EAGER_LOAD setting.
+    eager_load = None
+    # Defaults to the WIDGY_BLOG_FEED_ITEMS setting.
+    item_limit = None
+
+    def __call__(self, request, *args, **kwargs):
+        # Feed readers poll often, so answer with a 304 or a cached copy of
+        # the feed until something is published.
+        @condition(etag_func=self.get_etag, last_modified_func=self.get_last_modified)
+        def view(request, *args, **kwargs):
+            return self.get_cached_response(request, *args, **kwargs)
+
+        if self.model.has_published_table():
+            self.model.published_class.objects.sync_due()
+        with Timings().activate() as timings:
+            response = view(request, *args, **kwargs)
+        add_server_timing(response, timings)
+        return add_surrogate_keys(response, self.get_surrogate_keys(**kwargs))
+
+    def get_surrogate_keys(self, tag=None):
+        keys = [FEED_KEY]
+        if tag is not None:
+            keys.append(tag_key(tag))
+        return keys
+
+    def get_item_limit(self):
+        return self.item_limit or getattr(settings, 'WIDGY_BLOG_FEED_ITEMS', 20)
+
+    def get_cache_key(self, request, name, tag=None):
+        return make_key(name, request.scheme, request.get_host(), tag or '')
+
+    def get_last_modified(self, request, tag=None):
+        cache = get_cache()
+        key = self.get_cache_key(request, 'feed-modified', tag)
+        last_modified = cache.get(key)
+        if last_modified is None:
+            rows = self.model.published_class.objects.all()
+            if tag is not None:
+                rows = rows.filter(layout__tags__slug=tag)
+            last_modified = rows.aggregate(last_modified=Max('commit__publish_at'))['last_modified']
+            cache.set(key, last_modified)
+        return last_modified
+
+    def get_etag(self, request, tag=None):
+        # The cache key changes whenever a blog is published or unpublished,
+        # even when the latest commit doesn't.
+        key = self.get_cache_key(request, 'feed', tag)
+        return hashlib.md5(force_bytes('%s:%s' % (key, self.get_item_limit()))).hexdigest()
+
+    def get_cached_response(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_cache_key(request, 'feed', kwargs.get('tag'))
+        cached = cache.get(key)
+        record_cache('feed', cached is not None)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        with measure('feed'):
+            response = super(RssFeed, self).__call__(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, (response.content, response['Content-Type']))
+        return response
 
     def get_object(self, request, tag=None):
         if tag is not None:
@@ -272,10 +607,12 @@ class RssFeed(Feed):
             return None
 
     def items(self, obj=None):
-        qs = self.model.objects.published()
+        qs = self.model.objects.published().with_owners()
+        if get_eager_load(self):
+            qs = qs.eager()
         if obj is not None:
             qs = qs.filter(tags=obj)
-        return qs
+        return qs.order_by('-date')[:self.get_item_limit()]
 
     def item_title(self, item):
         return item.title